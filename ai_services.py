@@ -1,58 +1,307 @@
-# ai_services.py
-import openai
-import base64
-from io import BytesIO
-from PIL import Image
-from config import RULES_FILE, IMAGE_RULES_FILE, IMAGE_FOLDER, API_KEY_FILE
-import os
-
-class AIServices:
-    def __init__(self):
-        self.api_key = self.load_api_key()
-        if self.api_key:
-            openai.api_key = self.api_key
-    
-    def load_api_key(self):
-        if os.path.exists(API_KEY_FILE):
-            with open(API_KEY_FILE, 'r') as f:
-                return f.read().strip()
-        return None
-    
-    def check_api_key(self):
-        if not self.api_key:
-            raise ValueError("OpenAI API key not found. Please set your API key first.")
-    
-    def generate_article(self, prompt):
-        self.check_api_key()
-        rules = ""
-        if os.path.exists(RULES_FILE):
-            with open(RULES_FILE, 'r') as f:
-                rules = f.read()
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": f"Follow these rules: {rules}"},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        return response.choices[0].message.content
-    
-    def generate_image(self, prompt):
-        self.check_api_key()
-        image_rules = ""
-        if os.path.exists(IMAGE_RULES_FILE):
-            with open(IMAGE_RULES_FILE, 'r') as f:
-                image_rules = f.read()
-        
-        full_prompt = f"{prompt}. {image_rules}" if image_rules else prompt
-        
-        response = openai.Image.create(
-            prompt=full_prompt,
-            n=1,
-            size="512x512",
-            response_format="b64_json"
-        )
-        
-        image_data = base64.b64decode(response['data'][0]['b64_json'])
-        return Image.open(BytesIO(image_data))
\ No newline at end of file
+# ai_services.py
+import openai
+import aiohttp
+import asyncio
+import base64
+import requests
+from config import (
+    RULES_FILE, IMAGE_RULES_FILE, IMAGE_FOLDER, API_KEY_FILE,
+    OPENAI_POOL_SIZE, OPENAI_KEEPALIVE,
+    CACHE_ENABLED, ARTICLE_CACHE_FOLDER, IMAGE_CACHE_FOLDER, CACHE_MAX_BYTES, CACHE_TTL,
+    ARTICLE_MODEL, IMAGE_MODEL, ARTICLE_COMPLETION_TOKENS, OPENAI_RATE_LIMIT_RETRIES
+)
+from cache import ResponseCache
+from rules import load_rules
+from ratelimit import get_rate_limiter, estimate_tokens
+from metrics import get_metrics, token_cost, image_cost
+from images import GeneratedImage
+import os
+
+class AIServices:
+    def __init__(self, pool_size=OPENAI_POOL_SIZE, use_cache=CACHE_ENABLED, api_base=None, api_key=None,
+                 metrics=None):
+        self.api_key = api_key or self.load_api_key()
+        if self.api_key:
+            openai.api_key = self.api_key
+        self.api_base = api_base  # e.g. a local fake_openai server; None means the real API
+        self.pool_size = pool_size
+        self.article_cache = None
+        self.image_cache = None
+        if use_cache:
+            self.article_cache = ResponseCache(ARTICLE_CACHE_FOLDER, ".txt", CACHE_MAX_BYTES, CACHE_TTL)
+            self.image_cache = ResponseCache(IMAGE_CACHE_FOLDER, ".png", CACHE_MAX_BYTES, CACHE_TTL)
+        self._aio_session = None
+        self._aio_loop = None
+        self.article_limiter = get_rate_limiter(ARTICLE_MODEL)
+        self.image_limiter = get_rate_limiter(IMAGE_MODEL)
+        self.metrics = metrics or get_metrics()
+        # Let the limiters see the rate limit headers of every sync response
+        openai.requestssession = self._make_requests_session
+    
+    def load_api_key(self):
+        if os.path.exists(API_KEY_FILE):
+            with open(API_KEY_FILE, 'r') as f:
+                return f.read().strip()
+        return None
+    
+    def check_api_key(self):
+        if not self.api_key:
+            raise ValueError("OpenAI API key not found. Please set your API key first.")
+    
+    def _article_request(self, prompt):
+        rules = load_rules(RULES_FILE)
+        return dict(
+            model=ARTICLE_MODEL,
+            messages=[
+                {"role": "system", "content": f"Follow these rules: {rules}"},
+                {"role": "user", "content": prompt}
+            ]
+        )
+
+    def _image_request(self, prompt):
+        image_rules = load_rules(IMAGE_RULES_FILE)
+        full_prompt = f"{prompt}. {image_rules}" if image_rules else prompt
+
+        return dict(
+            model=IMAGE_MODEL,
+            prompt=full_prompt,
+            n=1,
+            size="512x512",
+            response_format="b64_json"
+        )
+
+    def _limiter_for(self, url):
+        if "/chat/completions" in url:
+            return self.article_limiter
+        if "/images/" in url:
+            return self.image_limiter
+        return None
+
+    def _on_response(self, response, *args, **kwargs):
+        limiter = self._limiter_for(response.url)
+        if limiter is not None:
+            limiter.update_from_headers(response.status_code, response.headers)
+
+    def _make_requests_session(self):
+        """Session factory for the openai library; one session per thread"""
+        session = requests.Session()
+        session.hooks['response'].append(self._on_response)
+        return session
+
+    def _estimate_article_tokens(self, request):
+        prompt_tokens = sum(estimate_tokens(message['content']) for message in request['messages'])
+        return prompt_tokens + ARTICLE_COMPLETION_TOKENS
+
+    def _rate_limited(self, limiter, tokens, create, **params):
+        """Wait for the limiter, then call create(); retries 429s the limiter missed"""
+        if self.api_base:
+            params['api_base'] = self.api_base
+        for attempt in range(OPENAI_RATE_LIMIT_RETRIES + 1):
+            limiter.acquire(tokens)
+            try:
+                return create(**params)
+            except openai.error.RateLimitError:
+                if attempt == OPENAI_RATE_LIMIT_RETRIES:
+                    raise
+
+    def _record_article(self, call, request, article, prompt_tokens, completion_tokens):
+        call.bytes_sent = sum(len(message['content'].encode('utf-8')) for message in request['messages'])
+        call.bytes_received = len(article.encode('utf-8'))
+        call.prompt_tokens = prompt_tokens or 0
+        call.completion_tokens = completion_tokens or 0
+        call.cost = token_cost(request['model'], call.prompt_tokens, call.completion_tokens)
+
+    def _record_image(self, call, request, response):
+        call.bytes_sent = len(request['prompt'].encode('utf-8'))
+        call.bytes_received = sum(len(item['b64_json']) for item in response['data'])
+        call.cost = image_cost(request['model'], request['size'], len(response['data']))
+
+    def _image_bytes(self, response):
+        return base64.b64decode(response['data'][0]['b64_json'])
+
+    def _cached(self, cache, request, bypass_cache):
+        """Return (key, cached bytes) for a request, or (key, None) on a miss"""
+        if cache is None:
+            return None, None
+        key = ResponseCache.make_key(request)
+        if bypass_cache:
+            return key, None
+        return key, cache.get(key)
+
+    def _store(self, cache, key, data):
+        if cache is not None:
+            cache.put(key, data)
+
+    # Steps shared by the sync and async methods, which only differ in the API call itself
+    def _begin_article(self, call, prompt, bypass_cache):
+        """Return (request, cache key, estimated tokens, cached article or None)"""
+        request = self._article_request(prompt)
+        key, cached = self._cached(self.article_cache, request, bypass_cache)
+        if cached is not None:
+            call.cached = True
+            return request, key, 0, cached.decode('utf-8')
+        self.check_api_key()
+        return request, key, self._estimate_article_tokens(request), None
+
+    def _finish_article(self, call, request, key, tokens, response):
+        """Record a completed article response and return its text"""
+        usage = response.get('usage', {})
+        self.article_limiter.record_usage(tokens, usage.get('total_tokens'))
+        article = response.choices[0].message.content
+        self._record_article(call, request, article, usage.get('prompt_tokens'), usage.get('completion_tokens'))
+        self._store(self.article_cache, key, article.encode('utf-8'))
+        return article
+
+    def _finish_stream(self, call, request, key, tokens, chunks):
+        """Record a finished article stream from its deltas"""
+        article = "".join(chunks)
+        prompt_tokens = tokens - ARTICLE_COMPLETION_TOKENS
+        completion_tokens = estimate_tokens(article)
+        self.article_limiter.record_usage(tokens, prompt_tokens + completion_tokens)
+        self._record_article(call, request, article, prompt_tokens, completion_tokens)
+        self._store(self.article_cache, key, article.encode('utf-8'))
+
+    def _begin_image(self, call, prompt, bypass_cache):
+        """Return (request, cache key, cached image bytes or None)"""
+        request = self._image_request(prompt)
+        key, image_data = self._cached(self.image_cache, request, bypass_cache)
+        if image_data is not None:
+            call.cached = True
+        else:
+            self.check_api_key()
+        return request, key, image_data
+
+    def _finish_image(self, call, request, key, response):
+        """Record an image response and return the image bytes"""
+        self._record_image(call, request, response)
+        image_data = self._image_bytes(response)
+        self._store(self.image_cache, key, image_data)
+        return image_data
+
+    def generate_article(self, prompt, bypass_cache=False):
+        with self.metrics.track("generate_article") as call:
+            request, key, tokens, cached = self._begin_article(call, prompt, bypass_cache)
+            if cached is not None:
+                return cached
+            response = self._rate_limited(self.article_limiter, tokens, openai.ChatCompletion.create, **request)
+            return self._finish_article(call, request, key, tokens, response)
+
+    def stream_article(self, prompt, bypass_cache=False):
+        """Yield the article as content deltas while the model produces it.
+
+        Joining every delta gives the same text generate_article() returns.
+        A cached article is yielded as a single delta. Streams report no
+        usage, so token counts are estimated from the text.
+        """
+        with self.metrics.track("stream_article") as call:
+            request, key, tokens, cached = self._begin_article(call, prompt, bypass_cache)
+            if cached is not None:
+                yield cached
+                return
+            response = self._rate_limited(
+                self.article_limiter, tokens, openai.ChatCompletion.create, stream=True, **request
+            )
+            chunks = []
+            for chunk in response:
+                delta = chunk.choices[0].delta.get("content")
+                if delta:
+                    chunks.append(delta)
+                    yield delta
+            self._finish_stream(call, request, key, tokens, chunks)
+
+    def generate_image(self, prompt, bypass_cache=False):
+        return self.generate_image_bytes(prompt, bypass_cache).image
+
+    def generate_image_bytes(self, prompt, bypass_cache=False):
+        """Return the image as a GeneratedImage, leaving the pixels undecoded"""
+        with self.metrics.track("generate_image") as call:
+            request, key, image_data = self._begin_image(call, prompt, bypass_cache)
+            if image_data is None:
+                response = self._rate_limited(self.image_limiter, 0, openai.Image.create, **request)
+                image_data = self._finish_image(call, request, key, response)
+            return GeneratedImage(image_data)
+
+    def cache_stats(self):
+        """Return hit/miss counters for the article and image caches"""
+        return {
+            'article': self.article_cache.stats() if self.article_cache else None,
+            'image': self.image_cache.stats() if self.image_cache else None,
+        }
+
+    # --- Async API ---
+    def _get_aio_session(self):
+        """Return the pooled aiohttp session for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._aio_session is None or self._aio_session.closed or self._aio_loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=OPENAI_KEEPALIVE)
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_request_end.append(self._on_aio_response)
+            self._aio_session = aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+            self._aio_loop = loop
+        return self._aio_session
+
+    async def _on_aio_response(self, session, context, params):
+        limiter = self._limiter_for(str(params.url))
+        if limiter is not None:
+            limiter.update_from_headers(params.response.status, params.response.headers)
+
+    async def _acall(self, limiter, tokens, create, **params):
+        """Async counterpart of _rate_limited() on the pooled session"""
+        if self.api_base:
+            params['api_base'] = self.api_base
+        token = openai.aiosession.set(self._get_aio_session())
+        try:
+            for attempt in range(OPENAI_RATE_LIMIT_RETRIES + 1):
+                await limiter.aacquire(tokens)
+                try:
+                    return await create(**params)
+                except openai.error.RateLimitError:
+                    if attempt == OPENAI_RATE_LIMIT_RETRIES:
+                        raise
+        finally:
+            openai.aiosession.reset(token)
+
+    async def agenerate_article(self, prompt, bypass_cache=False):
+        with self.metrics.track("generate_article") as call:
+            request, key, tokens, cached = self._begin_article(call, prompt, bypass_cache)
+            if cached is not None:
+                return cached
+            response = await self._acall(self.article_limiter, tokens, openai.ChatCompletion.acreate, **request)
+            return self._finish_article(call, request, key, tokens, response)
+
+    async def astream_article(self, prompt, bypass_cache=False):
+        """Async counterpart of stream_article()"""
+        with self.metrics.track("stream_article") as call:
+            request, key, tokens, cached = self._begin_article(call, prompt, bypass_cache)
+            if cached is not None:
+                yield cached
+                return
+            response = await self._acall(
+                self.article_limiter, tokens, openai.ChatCompletion.acreate, stream=True, **request
+            )
+            chunks = []
+            async for chunk in response:
+                delta = chunk.choices[0].delta.get("content")
+                if delta:
+                    chunks.append(delta)
+                    yield delta
+            self._finish_stream(call, request, key, tokens, chunks)
+
+    async def agenerate_image(self, prompt, bypass_cache=False):
+        return (await self.agenerate_image_bytes(prompt, bypass_cache)).image
+
+    async def agenerate_image_bytes(self, prompt, bypass_cache=False):
+        """Async counterpart of generate_image_bytes()"""
+        with self.metrics.track("generate_image") as call:
+            request, key, image_data = self._begin_image(call, prompt, bypass_cache)
+            if image_data is None:
+                response = await self._acall(self.image_limiter, 0, openai.Image.acreate, **request)
+                image_data = self._finish_image(call, request, key, response)
+            return GeneratedImage(image_data)
+
+    async def aclose(self):
+        """Close the pooled HTTP session used by the async API"""
+        if self._aio_session is not None and not self._aio_session.closed:
+            await self._aio_session.close()
+        self._aio_session = None
+        self._aio_loop = None
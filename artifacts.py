@@ -0,0 +1,328 @@
+# artifacts.py
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from config import ARTIFACTS_DB_FILE, ARTICLES_FOLDER, IMAGE_FOLDER, ensure_folders_exist
+from images import GeneratedImage
+from wordpress import WordPressClient, split_article
+from sqlite_store import SQLiteStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    title TEXT,
+    key_phrase TEXT,
+    article_sha256 TEXT NOT NULL,
+    article_path TEXT NOT NULL,
+    image_sha256 TEXT,
+    image_path TEXT,
+    post_id INTEGER,
+    media_id INTEGER,
+    created_at REAL NOT NULL,
+    posted_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_articles_prompt ON articles (prompt);
+CREATE INDEX IF NOT EXISTS idx_articles_created ON articles (created_at);
+CREATE INDEX IF NOT EXISTS idx_articles_post ON articles (post_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, key_phrase, meta_description, body,
+    content='', tokenize='porter unicode61'
+);
+"""
+
+MAX_KEY_PHRASE_LENGTH = 60
+SEARCH_WEIGHTS = (10.0, 5.0, 3.0, 1.0)  # bm25 weights of title, key phrase, meta description, body
+_META_DESCRIPTION = re.compile(r"^\W*meta description\W*:?\s*(.*)$", re.IGNORECASE)
+_SEARCH_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def key_phrase_of(article):
+    """Return the key phrase the rules ask for on the line below the title, or None"""
+    lines = [line.strip() for line in article.strip().split("\n")]
+    if len(lines) > 1 and 0 < len(lines[1]) <= MAX_KEY_PHRASE_LENGTH:
+        return lines[1]
+    return None
+
+
+def search_fields(article):
+    """Split an article into (title, key phrase, meta description, body) for the search index"""
+    title, rest = split_article(article)
+    key_phrase = key_phrase_of(article)
+    meta_description = None
+    body = []
+    for line in rest.split("\n"):
+        match = _META_DESCRIPTION.match(line.strip())
+        if match and meta_description is None:
+            meta_description = match.group(1)
+        elif not (key_phrase and line.strip() == key_phrase and not body):
+            body.append(line)
+    return title, key_phrase, meta_description, "\n".join(body)
+
+
+def match_query(text):
+    """Turn free text into an FTS5 query that requires every word, ignoring FTS syntax"""
+    return " ".join(f'"{term}"' for term in _SEARCH_TERM.findall(text))
+
+
+class ArtifactStore(SQLiteStore):
+    """Every generated article and image, kept on disk with a SQLite index.
+
+    Articles are gzip-compressed and images stored as generated, both
+    under the SHA-256 of their content (fanned out into two-character
+    subfolders) so identical output is stored once. The index records
+    prompt, title, key phrase, timestamps and the WordPress post and
+    media ids, so large archives can be queried or re-posted without
+    walking ARTICLES_FOLDER and IMAGE_FOLDER. Connections are per thread
+    in WAL mode, as in JobStore.
+
+    A contentless FTS5 table over title, key phrase, meta description
+    and body is filled in the same transaction as each index row, so
+    search() always sees every recorded article without storing the
+    text a second time.
+    """
+
+    row_factory = sqlite3.Row
+
+    def __init__(self, path=ARTIFACTS_DB_FILE, articles_folder=ARTICLES_FOLDER, images_folder=IMAGE_FOLDER):
+        super().__init__(path)
+        self.articles_folder = articles_folder
+        self.images_folder = images_folder
+        conn = self._connect()
+        has_search_index = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'articles_fts'").fetchone()
+        conn.executescript(SCHEMA)
+        if not has_search_index:
+            self.reindex()  # Archives created before search existed
+
+    @staticmethod
+    def _write_once(folder, digest, suffix, data):
+        """Write data under its digest unless that file already exists; returns the path"""
+        subfolder = os.path.join(folder, digest[:2])
+        path = os.path.join(subfolder, digest + suffix)
+        if not os.path.exists(path):
+            os.makedirs(subfolder, exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return path
+
+    def save_article_text(self, article):
+        """Store article text compressed and return (sha256, path)"""
+        data = article.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        # mtime=0 keeps the compressed bytes identical for identical text
+        return digest, self._write_once(self.articles_folder, digest, ".txt.gz", gzip.compress(data, mtime=0))
+
+    def save_image(self, image):
+        """Store a GeneratedImage (or encoded bytes) and return its path"""
+        return self._save_image(image)[1]
+
+    def _save_image(self, image):
+        if not isinstance(image, GeneratedImage):
+            image = GeneratedImage(image)
+        digest = hashlib.sha256(image.data).hexdigest()
+        return digest, self._write_once(self.images_folder, digest, image.extension, image.data)
+
+    def record(self, prompt, article, image=None, image_path=None, post_id=None, media_id=None):
+        """Store an article and optionally its image, index them and return the artifact id.
+
+        Pass either the image itself or an image_path returned by save_image().
+        """
+        article_sha, article_path = self.save_article_text(article)
+        image_sha = None
+        if image is not None:
+            image_sha, image_path = self._save_image(image)
+        elif image_path is not None:
+            image_sha = os.path.basename(image_path).split(".")[0]
+
+        fields = search_fields(article)
+        now = time.time()
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO articles (prompt, title, key_phrase, article_sha256, article_path, image_sha256, "
+                "image_path, post_id, media_id, created_at, posted_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (prompt, fields[0], fields[1], article_sha, article_path,
+                 image_sha, image_path, post_id, media_id, now, now if post_id else None)
+            )
+            conn.execute(
+                "INSERT INTO articles_fts (rowid, title, key_phrase, meta_description, body) VALUES (?, ?, ?, ?, ?)",
+                (cursor.lastrowid, *fields)
+            )
+        return cursor.lastrowid
+
+    def attach_image(self, artifact_id, image_path):
+        """Add an image returned by save_image() to an artifact recorded without one"""
+        self._connect().execute(
+            "UPDATE articles SET image_sha256 = ?, image_path = ? WHERE id = ?",
+            (os.path.basename(image_path).split(".")[0], image_path, artifact_id)
+        )
+
+    def mark_posted(self, artifact_id, post_id, media_id=None):
+        """Record the WordPress ids once an artifact has been posted"""
+        self._connect().execute(
+            "UPDATE articles SET post_id = ?, media_id = COALESCE(?, media_id), posted_at = ? WHERE id = ?",
+            (post_id, media_id, time.time(), artifact_id)
+        )
+
+    def get(self, artifact_id):
+        row = self._connect().execute("SELECT * FROM articles WHERE id = ?", (artifact_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def load_article(self, artifact_id):
+        """Return the full text of a stored article"""
+        artifact = self.get(artifact_id)
+        if artifact is None:
+            raise KeyError(f"No artifact {artifact_id}")
+        with gzip.open(artifact['article_path'], 'rt', encoding='utf-8') as f:
+            return f.read()
+
+    def find(self, prompt=None, posted=None, since=None, limit=100):
+        """Return index rows, newest first, filtered by exact prompt, posted state and creation time"""
+        conditions, params = [], []
+        if prompt is not None:
+            conditions.append("prompt = ?")
+            params.append(prompt)
+        if posted is not None:
+            conditions.append("post_id IS NOT NULL" if posted else "post_id IS NULL")
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._connect().execute(
+            f"SELECT * FROM articles {where} ORDER BY id DESC LIMIT ?", (*params, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def search(self, query, limit=20, raw=False):
+        """Return index rows for articles matching query, best match first.
+
+        query is free text that must match every word (stemmed, so
+        "gardening" finds "garden"); with raw=True it is passed to FTS5
+        as is, allowing OR, NEAR, prefix* and column: filters.
+        """
+        if not raw:
+            query = match_query(query)
+            if not query:
+                return []
+        weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+        rows = self._connect().execute(
+            f"SELECT articles.*, bm25(articles_fts, {weights}) AS rank FROM articles_fts "
+            "JOIN articles ON articles.id = articles_fts.rowid "
+            "WHERE articles_fts MATCH ? ORDER BY rank LIMIT ?",
+            (query, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def reindex(self):
+        """Rebuild the search index from the stored articles; returns how many were indexed"""
+        artifacts = self._connect().execute("SELECT id, article_path FROM articles ORDER BY id").fetchall()
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('delete-all')")
+            for artifact_id, article_path in artifacts:
+                with gzip.open(article_path, 'rt', encoding='utf-8') as f:
+                    fields = search_fields(f.read())
+                conn.execute(
+                    "INSERT INTO articles_fts (rowid, title, key_phrase, meta_description, body) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (artifact_id, *fields)
+                )
+        return len(artifacts)
+
+    def counts(self):
+        """Return (stored, posted) article counts"""
+        return tuple(self._connect().execute("SELECT COUNT(*), COUNT(post_id) FROM articles").fetchone())
+
+
+def repost(store, wp_client, artifacts, categories=None, schedule_time=None):
+    """Post stored artifacts through the bulk API; returns the PostResults"""
+    posts = []
+    for artifact in artifacts:
+        title, content = split_article(store.load_article(artifact['id']))
+        posts.append({
+            'title': title,
+            'content': content,
+            'image_path': artifact['image_path'],
+            'categories': categories,
+            'schedule_time': schedule_time,
+        })
+    results = wp_client.create_posts(posts)
+    for artifact, result in zip(artifacts, results):
+        if result.ok:
+            store.mark_posted(artifact['id'], result.post['id'], result.post.get('featured_media') or None)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query and re-post the archive of generated articles")
+    parser.add_argument("--db", default=ARTIFACTS_DB_FILE, help="Artifact index file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    listing = commands.add_parser("list", help="List stored articles, newest first")
+    listing.add_argument("--prompt", help="Only articles generated from this exact prompt")
+    listing.add_argument("--unposted", action="store_true", help="Only articles not yet posted")
+    listing.add_argument("-n", "--limit", type=int, default=20)
+
+    show = commands.add_parser("show", help="Print a stored article")
+    show.add_argument("id", type=int)
+
+    find = commands.add_parser("search", help="Full-text search of titles, key phrases and bodies")
+    find.add_argument("query", nargs="+", help="Words that must all appear")
+    find.add_argument("--raw", action="store_true", help="Treat the query as FTS5 syntax (OR, NEAR, prefix*)")
+    find.add_argument("-n", "--limit", type=int, default=20)
+
+    commands.add_parser("reindex", help="Rebuild the search index from the stored articles")
+
+    post = commands.add_parser("repost", help="Post stored articles to WordPress")
+    post.add_argument("ids", type=int, nargs="*", help="Artifact ids (default: every unposted article)")
+    post.add_argument("--category", type=int, action="append", help="Category id (repeatable)")
+    post.add_argument("--schedule", help="ISO 8601 publish time")
+
+    args = parser.parse_args(argv)
+    ensure_folders_exist()
+    store = ArtifactStore(args.db)
+
+    if args.command == "list":
+        for artifact in store.find(args.prompt, False if args.unposted else None, limit=args.limit):
+            created = time.strftime("%Y-%m-%d %H:%M", time.localtime(artifact['created_at']))
+            posted = f"post {artifact['post_id']}" if artifact['post_id'] else "unposted"
+            print(f"{artifact['id']:>7}  {created}  {posted:>12}  {artifact['title']}")
+        stored, posted_count = store.counts()
+        print(f"{stored} stored, {posted_count} posted")
+    elif args.command == "show":
+        print(store.load_article(args.id))
+    elif args.command == "search":
+        started = time.perf_counter()
+        results = store.search(" ".join(args.query), args.limit, args.raw)
+        elapsed = (time.perf_counter() - started) * 1000
+        for artifact in results:
+            posted = f"post {artifact['post_id']}" if artifact['post_id'] else "unposted"
+            print(f"{artifact['id']:>7}  {posted:>12}  {artifact['title']}  [{artifact['key_phrase'] or ''}]")
+        print(f"{len(results)} results in {elapsed:.1f} ms")
+    elif args.command == "reindex":
+        print(f"Indexed {store.reindex()} articles")
+    elif args.command == "repost":
+        if args.ids:
+            artifacts = [artifact for artifact in map(store.get, args.ids) if artifact is not None]
+        else:
+            artifacts = store.find(posted=False, limit=-1)
+        failed = 0
+        for artifact, result in zip(artifacts, repost(store, WordPressClient(), artifacts,
+                                                      args.category, args.schedule)):
+            if result.ok:
+                print(f"[{artifact['id']}] posted {result.post['id']}")
+            else:
+                failed += 1
+                print(f"[{artifact['id']}] failed: {result.error}", file=sys.stderr)
+        return 1 if failed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
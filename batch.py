@@ -0,0 +1,236 @@
+# batch.py
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import BATCH_CONCURRENCY, DUPLICATE_CHECK_ENABLED, ensure_folders_exist
+from ai_services import AIServices
+from metrics import get_metrics
+from artifacts import ArtifactStore
+from duplicates import DuplicateIndex
+
+
+class BatchResult:
+    """Outcome of generating one prompt in a batch"""
+
+    def __init__(self, index, prompt):
+        self.index = index
+        self.prompt = prompt
+        self.article = None
+        self.image = None  # GeneratedImage; its .image property decodes the pixels
+        self.errors = {}
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+class BatchGenerator:
+    """Generate articles and images for many prompts with a bounded worker pool"""
+
+    METHODS = {'article': "generate_article", 'image': "generate_image_bytes"}
+
+    def __init__(self, ai=None, concurrency=BATCH_CONCURRENCY, with_images=True):
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+        self.ai = ai or AIServices()
+        self.concurrency = concurrency
+        self.with_images = with_images
+
+    def _kinds(self):
+        """Return the kinds of generation to run for every prompt"""
+        return ['article', 'image'] if self.with_images else ['article']
+
+    def run(self, prompts):
+        """Yield a BatchResult for each prompt as soon as all of its calls finish.
+
+        At most `concurrency` OpenAI calls are in flight at any time, and
+        prompts are consumed lazily so long inputs do not queue up in memory.
+        """
+        results = {}
+        remaining = {}
+        pending = {}
+        calls = self._iter_calls(prompts, results, remaining)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            def submit_next():
+                for index, kind, func, prompt in calls:
+                    pending[executor.submit(func, prompt)] = (index, kind)
+                    return True
+                return False
+
+            while len(pending) < self.concurrency and submit_next():
+                pass
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, kind = pending.pop(future)
+                    result = results[index]
+                    try:
+                        setattr(result, kind, future.result())
+                    except Exception as e:
+                        result.errors[kind] = e
+
+                    remaining[index] -= 1
+                    if remaining[index] == 0:
+                        del remaining[index]
+                        yield results.pop(index)
+
+                    submit_next()
+
+    def _iter_calls(self, prompts, results, remaining):
+        """Lazily expand prompts into (index, kind, func, prompt) calls"""
+        for index, prompt in enumerate(prompts):
+            kinds = self._kinds()
+            results[index] = BatchResult(index, prompt)
+            remaining[index] = len(kinds)
+            for kind in kinds:
+                yield index, kind, getattr(self.ai, self.METHODS[kind]), prompt
+
+    async def arun(self, prompts):
+        """Async counterpart of run() built on the pooled AIServices client.
+
+        Every call goes through the same keep-alive connection pool, so a
+        large concurrency setting costs coroutines rather than threads.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending = set()
+        prompts = enumerate(prompts)
+
+        def submit_next():
+            for index, prompt in prompts:
+                pending.add(asyncio.ensure_future(self._agenerate(index, prompt, semaphore)))
+                return True
+            return False
+
+        try:
+            while len(pending) < self.concurrency and submit_next():
+                pass
+
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    yield task.result()
+                    submit_next()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _agenerate(self, index, prompt, semaphore):
+        result = BatchResult(index, prompt)
+        kinds = self._kinds()
+
+        async def call(kind):
+            async with semaphore:
+                return await getattr(self.ai, "a" + self.METHODS[kind])(prompt)
+
+        outcomes = await asyncio.gather(*(call(kind) for kind in kinds), return_exceptions=True)
+        for kind, outcome in zip(kinds, outcomes):
+            if isinstance(outcome, Exception):
+                result.errors[kind] = outcome
+            else:
+                setattr(result, kind, outcome)
+        return result
+
+
+def read_prompts(path):
+    """Read one prompt per non-empty line"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate articles for a file of prompts without the GUI")
+    parser.add_argument("prompts", help="Text file with one prompt per line")
+    parser.add_argument("-c", "--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help="Maximum number of OpenAI calls in flight")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Drive all calls from one event loop over a pooled HTTP client")
+    parser.add_argument("--no-cache", action="store_true", help="Always call OpenAI instead of reusing cached responses")
+    parser.add_argument("--no-images", action="store_true", help="Only generate articles")
+    parser.add_argument("--image-dir", help="Save generated images as PNG files in this folder")
+    parser.add_argument("-o", "--output", help="Write results as JSON lines to this file (default: stdout)")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="Do not keep articles and images in the local artifact store")
+    parser.add_argument("--no-dedupe", action="store_true",
+                        help="Do not check articles against the near-duplicate index")
+    args = parser.parse_args(argv)
+
+    if args.image_dir:
+        os.makedirs(args.image_dir, exist_ok=True)
+
+    artifacts = None
+    if not args.no_archive:
+        ensure_folders_exist()
+        artifacts = ArtifactStore()
+
+    duplicates = batch_duplicates = None
+    if DUPLICATE_CHECK_ENABLED and not args.no_dedupe:
+        # Nothing is posted here, so articles are compared with the posted ones without joining them;
+        # an in-memory index catches repeats within this batch
+        duplicates = DuplicateIndex()
+        batch_duplicates = DuplicateIndex(":memory:", hasher=duplicates.hasher)
+
+    ai = AIServices(use_cache=not args.no_cache)
+    generator = BatchGenerator(ai, concurrency=args.concurrency, with_images=not args.no_images)
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    failed = 0
+
+    def write(result):
+        record = {
+            'index': result.index,
+            'prompt': result.prompt,
+            'article': result.article,
+            'image_path': None,
+            'artifact_id': None,
+            'duplicate_of': None,
+            'errors': {kind: str(e) for kind, e in result.errors.items()},
+        }
+        if duplicates is not None and result.article is not None:
+            matches = duplicates.find(result.article)
+            match = matches[0] if matches else batch_duplicates.check(result.prompt, result.article)[0]
+            if match is not None:
+                record['duplicate_of'] = {
+                    'prompt': match.prompt, 'title': match.title, 'similarity': round(match.similarity, 3)
+                }
+        if artifacts is not None and result.article is not None:
+            record['artifact_id'] = artifacts.record(result.prompt, result.article, image=result.image)
+            record['image_path'] = artifacts.get(record['artifact_id'])['image_path']
+        if args.image_dir and result.image is not None:
+            record['image_path'] = result.image.save(
+                os.path.join(args.image_dir, f"{result.index:05d}{result.image.extension}")
+            )
+        out.write(json.dumps(record) + "\n")
+        out.flush()
+        return result.ok
+
+    async def run_async():
+        failures = 0
+        try:
+            async for result in generator.arun(read_prompts(args.prompts)):
+                failures += not write(result)
+        finally:
+            await generator.ai.aclose()
+        return failures
+
+    try:
+        if args.use_async:
+            failed = asyncio.run(run_async())
+        else:
+            for result in generator.run(read_prompts(args.prompts)):
+                failed += not write(result)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        get_metrics().write()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
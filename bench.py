@@ -0,0 +1,206 @@
+# bench.py
+import argparse
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENARIOS = {  # name: number of prompts
+    'single': 1,
+    'batch_100': 100,
+    'batch_10k': 10000,
+}
+
+# Allowed drift against the baseline before a metric counts as a regression
+THRESHOLDS = {
+    'throughput': 0.10,  # items/s may drop by 10%
+    'p95': 0.20,  # per-stage p95 may rise by 20%
+    'peak_rss_mb': 0.15,
+    'cpu_seconds': 0.20,
+}
+
+DEFAULT_RESULTS_FILE = "bench_results.json"
+DEFAULT_BASELINE_FILE = "bench_baseline.json"
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(values):
+    """p50/p95/p99/mean of a list of seconds, reported in milliseconds"""
+    if not values:
+        return None
+    return {
+        'p50_ms': percentile(values, 0.50) * 1000,
+        'p95_ms': percentile(values, 0.95) * 1000,
+        'p99_ms': percentile(values, 0.99) * 1000,
+        'mean_ms': sum(values) / len(values) * 1000,
+        'count': len(values),
+    }
+
+
+def run_scenario(count, openai_base, wordpress_url):
+    """Push `count` prompts through the full pipeline; runs inside a worker process"""
+    from config import OPENAI_RATE_LIMITS
+    # Measure our own overhead, not the account's OpenAI quota
+    for model in OPENAI_RATE_LIMITS:
+        OPENAI_RATE_LIMITS[model] = (10 ** 9, 10 ** 12)
+
+    from ai_services import AIServices
+    from wordpress import WordPressClient
+    from pipeline import Pipeline, posting_stages
+    from metrics import get_metrics
+    from images import ImageProcessor
+
+    ai = AIServices(api_base=openai_base, api_key="bench", use_cache=False)
+    # No media index: it would write the operator's media_index.db in the working directory
+    wp_client = WordPressClient(wp_url=wordpress_url, username="user", password="pass", dedupe_media=False)
+    stage_times = {}
+    end_to_end = []
+    failures = 0
+
+    processor = ImageProcessor()
+    with tempfile.TemporaryDirectory() as image_folder:
+        stages = posting_stages(ai, wp_client, image_folder=image_folder, processor=processor)
+        prompts = (f"Benchmark prompt {n} about seasonal gardening" for n in range(count))
+        started = time.perf_counter()
+        for item in Pipeline(stages).run(prompts):
+            if not item.ok:
+                failures += 1
+                continue
+            for stage, seconds in item.timings.items():
+                stage_times.setdefault(stage, []).append(seconds)
+            end_to_end.append(sum(item.timings.values()))
+        wall = time.perf_counter() - started
+    processor.close()  # Reaps the image workers so their CPU time is counted below
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        'items': count,
+        'failures': failures,
+        'wall_seconds': wall,
+        'throughput': (count - failures) / wall if wall else None,
+        'stages': {stage: summarize(times) for stage, times in stage_times.items()},
+        'end_to_end': summarize(end_to_end),
+        'peak_rss_mb': usage.ru_maxrss / 1024,  # ru_maxrss is in KiB on Linux
+        'cpu_seconds': usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime,
+        'calls': get_metrics().summary()['operations'],
+    }
+
+
+def run_all(scenarios, openai_settings=None, wordpress_settings=None):
+    """Run each scenario in its own process against shared local fake servers"""
+    from fake_openai import FakeOpenAIServer, FakeOpenAISettings
+    from fake_wordpress import FakeWordPressServer, FakeWordPressSettings
+
+    openai_settings = openai_settings or FakeOpenAISettings(latency=0.02, token_rate=100000, image_latency=0.02)
+    wordpress_settings = wordpress_settings or FakeWordPressSettings(latency=0.005, upload_latency=0.005)
+    results = {'created': time.strftime("%Y-%m-%dT%H:%M:%S"), 'python': sys.version.split()[0], 'scenarios': {}}
+
+    with FakeOpenAIServer(openai_settings) as openai_server, FakeWordPressServer(wordpress_settings) as wp_server:
+        for name in scenarios:
+            # A fresh process per scenario keeps peak RSS and CPU time attributable
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", str(SCENARIOS[name]),
+                 "--openai-base", openai_server.api_base, "--wordpress-url", wp_server.url],
+                capture_output=True, text=True, check=True
+            )
+            results['scenarios'][name] = json.loads(completed.stdout)
+            print(format_scenario(name, results['scenarios'][name]))
+    return results
+
+
+def format_scenario(name, result):
+    lines = [
+        f"{name}: {result['items']} items in {result['wall_seconds']:.2f}s "
+        f"({result['throughput']:.1f} items/s), {result['failures']} failed, "
+        f"peak RSS {result['peak_rss_mb']:.1f} MB, CPU {result['cpu_seconds']:.2f}s"
+    ]
+    for stage, stats in result['stages'].items():
+        lines.append(f"  {stage:>13}: p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms  "
+                     f"p99 {stats['p99_ms']:8.1f} ms")
+    return "\n".join(lines)
+
+
+def compare(results, baseline):
+    """Return a list of human-readable regressions against the baseline"""
+    regressions = []
+
+    def check(label, current, previous, tolerance, higher_is_better=False):
+        if current is None or not previous:
+            return
+        change = (current - previous) / previous
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append(f"{label}: {previous:.2f} -> {current:.2f} ({change:+.0%})")
+
+    for name, result in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        check(f"{name} throughput", result['throughput'], previous['throughput'],
+              THRESHOLDS['throughput'], higher_is_better=True)
+        check(f"{name} peak RSS MB", result['peak_rss_mb'], previous['peak_rss_mb'], THRESHOLDS['peak_rss_mb'])
+        check(f"{name} CPU seconds", result['cpu_seconds'], previous['cpu_seconds'], THRESHOLDS['cpu_seconds'])
+        for stage, stats in result['stages'].items():
+            old = previous['stages'].get(stage)
+            if old:
+                check(f"{name} {stage} p95 ms", stats['p95_ms'], old['p95_ms'], THRESHOLDS['p95'])
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark prompt -> article -> image -> upload -> post offline")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable, default: all)")
+    parser.add_argument("-o", "--output", default=DEFAULT_RESULTS_FILE, help="Machine-readable results file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_FILE, help="Baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--openai-base", help=argparse.SUPPRESS)
+    parser.add_argument("--wordpress-url", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        print(json.dumps(run_scenario(args.worker, args.openai_base, args.wordpress_url)))
+        return 0
+
+    scenarios = args.scenario or list(SCENARIOS)
+    results = run_all(scenarios)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        regressions = compare(results, json.load(f))
+    if regressions:
+        print("Regressions against baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
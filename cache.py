@@ -0,0 +1,113 @@
+# cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache for generation results.
+
+    Entries are stored as one file per key. A file's mtime records when it
+    was written (for the TTL) and its atime when it was last used (for LRU
+    eviction once the folder grows past max_bytes).
+    """
+
+    def __init__(self, folder, suffix, max_bytes, ttl):
+        self.folder = folder
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self._total_bytes = sum(entry.stat().st_size for entry in self._entries())
+
+    @staticmethod
+    def make_key(request):
+        """Hash every request parameter that affects the response"""
+        encoded = json.dumps(request, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + self.suffix)
+
+    def _entries(self):
+        with os.scandir(self.folder) as it:
+            return [entry for entry in it if entry.is_file() and entry.name.endswith(self.suffix)]
+
+    def get(self, key):
+        """Return the cached bytes for key, or None on a miss or expired entry"""
+        path = self._path(key)
+        now = time.time()
+        with self._lock:
+            try:
+                stat = os.stat(path)
+                if self.ttl and now - stat.st_mtime > self.ttl:
+                    self._remove(path, stat.st_size)
+                    self.misses += 1
+                    return None
+                with open(path, 'rb') as f:
+                    data = f.read()
+                # Record the use in atime while keeping mtime as the write time
+                os.utime(path, (now, stat.st_mtime))
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        """Store data under key and evict least recently used entries if needed"""
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        with self._lock:
+            try:
+                self._total_bytes -= os.stat(path).st_size
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+            self._total_bytes += len(data)
+            if self.max_bytes and self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path, size):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        self._total_bytes -= size
+        self.evictions += 1
+
+    def _evict(self):
+        # Trim to 90% of the limit so eviction doesn't run on every put
+        target = self.max_bytes * 0.9
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_atime)
+        for entry in entries:
+            if self._total_bytes <= target:
+                break
+            self._remove(entry.path, entry.stat().st_size)
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            for entry in self._entries():
+                os.remove(entry.path)
+            self._total_bytes = 0
+
+    def stats(self):
+        """Return hit/miss counters and the current cache size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'bytes': self._total_bytes,
+            }
@@ -0,0 +1,65 @@
+# category_cache.py
+import json
+import os
+from config import CATEGORY_CACHE_FILE
+
+
+class CategoryCache:
+    """WordPress categories persisted between launches.
+
+    Alongside the list we keep the ETag/Last-Modified validators and the
+    X-WP-Total count from the last full download, so a later conditional
+    request can confirm the list is still current.
+    """
+
+    def __init__(self, wp_url, path=CATEGORY_CACHE_FILE):
+        self.wp_url = wp_url
+        self.path = path
+
+    def load(self):
+        """Return the cached entry for this site, or None"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('wp_url') != self.wp_url:
+            return None
+        return entry
+
+    def save(self, categories, validators):
+        """Persist categories with the validators returned by fetch_categories"""
+        entry = {
+            'wp_url': self.wp_url,
+            'etag': validators.get('etag'),
+            'last_modified': validators.get('last_modified'),
+            'total': validators.get('total'),
+            'categories': categories,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self.path)
+
+
+def diff_categories(old, new):
+    """Compare two category lists by id.
+
+    Returns (added, removed, changed) where removed holds ids and the other
+    two hold category dicts from the new list.
+    """
+    old_by_id = {category['id']: category for category in old}
+    new_ids = set()
+    added = []
+    changed = []
+    for category in new:
+        new_ids.add(category['id'])
+        previous = old_by_id.get(category['id'])
+        if previous is None:
+            added.append(category)
+        elif previous != category:
+            changed.append(category)
+    removed = [category_id for category_id in old_by_id if category_id not in new_ids]
+    return added, removed, changed
@@ -1,22 +1,111 @@
-# config.py
-import os
-
-# Default paths for configuration files and folders
-RULES_FILE = "rules.txt"
-IMAGE_RULES_FILE = "image_rules.txt"
-API_KEY_FILE = "openai_api_key.txt"
-WP_CONFIG_FILE = "wordpress_config.txt"
-IMAGE_FOLDER = "generated_images"
-ARTICLES_FOLDER = "generated_articles"
-
-def ensure_folders_exist():
-    """Ensure all required folders exist"""
-    os.makedirs(IMAGE_FOLDER, exist_ok=True)
-    os.makedirs(ARTICLES_FOLDER, exist_ok=True)
-
-def load_api_key():
-    """Load the OpenAI API key from file"""
-    if os.path.exists(API_KEY_FILE):
-        with open(API_KEY_FILE, 'r') as f:
-            return f.read().strip()
+# config.py
+import os
+
+# Default paths for configuration files and folders
+RULES_FILE = "rules.txt"
+IMAGE_RULES_FILE = "image_rules.txt"
+API_KEY_FILE = "openai_api_key.txt"
+WP_CONFIG_FILE = "wordpress_config.txt"
+IMAGE_FOLDER = "generated_images"
+ARTICLES_FOLDER = "generated_articles"
+ARTIFACTS_DB_FILE = "artifacts.db"  # Index of everything stored in ARTICLES_FOLDER and IMAGE_FOLDER
+
+# Batch generation
+BATCH_CONCURRENCY = 8  # Maximum number of OpenAI calls in flight at once
+OPENAI_POOL_SIZE = 100  # Connections kept by the async OpenAI client
+OPENAI_KEEPALIVE = 30  # Seconds an idle OpenAI connection stays open
+
+# OpenAI models and client-side rate limits
+ARTICLE_MODEL = "gpt-3.5-turbo"
+IMAGE_MODEL = "dall-e-2"
+OPENAI_RATE_LIMITS = {  # model: (requests per minute, tokens per minute or None)
+    ARTICLE_MODEL: (3500, 90000),
+    IMAGE_MODEL: (50, None),
+}
+ARTICLE_COMPLETION_TOKENS = 800  # Expected completion size used when reserving tokens
+OPENAI_RATE_LIMIT_RETRIES = 5  # Retries after a 429 that got past the limiter
+
+# WordPress HTTP client
+WP_POOL_SIZE = 20  # Keep-alive connections kept to the WordPress host
+WP_MAX_RETRIES = 5  # Retries for 429 and 5xx responses
+WP_BACKOFF_FACTOR = 0.5  # Exponential backoff base in seconds, unless Retry-After says otherwise
+WP_TIMEOUT = 60  # Seconds to wait for WordPress to respond
+WP_BATCH_SIZE = 25  # Posts per /wp-json/batch/v1 call; WordPress allows at most 25
+CATEGORY_CACHE_FILE = "categories_cache.json"
+MEDIA_INDEX_FILE = "media_index.db"  # Content hash -> media id of uploaded images
+MEDIA_DEDUP_ENABLED = True  # Skip uploading images WordPress already has
+MEDIA_VERIFY = False  # Confirm an indexed media item still exists before reusing it
+
+# Near-duplicate detection
+DUPLICATE_INDEX_FILE = "duplicates.db"  # MinHash signatures and LSH buckets of posted articles
+DUPLICATE_CHECK_ENABLED = True
+DUPLICATE_ACTION = "reject"  # Or "flag" to post near-duplicates anyway and only report them
+DUPLICATE_THRESHOLD = 0.8  # Estimated Jaccard similarity of word shingles that counts as a duplicate
+SHINGLE_SIZE = 3  # Words per shingle
+MINHASH_PERMUTATIONS = 128  # Changing these two needs "python duplicates.py rebuild"
+LSH_BANDS = 16  # Bands of MINHASH_PERMUTATIONS // LSH_BANDS rows each
+
+# Durable job queue
+JOBS_DB_FILE = "jobs.db"
+JOB_CLAIM_TIMEOUT = 15 * 60  # Seconds before a claimed job is considered abandoned
+JOB_MAX_ATTEMPTS = 3  # Failures before a job is marked failed
+
+# Staged pipeline
+PIPELINE_WORKERS = {  # Worker threads per stage
+    'article': 8,
+    'dedupe': 2,
+    'image': 4,
+    'optimize': os.cpu_count() or 1,  # Each waits on one process of the image pool
+    'encode': 2,
+    'upload_media': 4,
+    'create_post': 4,
+}
+PIPELINE_QUEUE_SIZE = 16  # Items allowed to wait between two stages
+
+# Image post-processing
+IMAGE_OPTIMIZE = True  # Re-encode generated images for the web before uploading them
+IMAGE_FORMAT = "WEBP"  # Or "AVIF", which needs Pillow 11.2+ or the pillow-avif-plugin package
+IMAGE_QUALITY = 80
+IMAGE_PROCESS_WORKERS = os.cpu_count() or 1
+# Local thumbnails saved next to each optimized image, as name: (width, height, crop), for example
+# {'thumbnail': (150, 150, True), 'medium': (300, 300, False)}. They are never uploaded: WordPress
+# makes its own sizes from the uploaded image, so none are made unless sizes are listed here.
+THUMBNAIL_SIZES = {}
+
+# Response cache
+CACHE_ENABLED = True
+ARTICLE_CACHE_FOLDER = os.path.join(ARTICLES_FOLDER, "cache")
+IMAGE_CACHE_FOLDER = os.path.join(IMAGE_FOLDER, "cache")
+CACHE_MAX_BYTES = 500 * 1024 * 1024  # Per cache; least recently used entries go first
+CACHE_TTL = 7 * 24 * 3600  # Seconds before a cached response is regenerated
+
+# GUI responsiveness
+BACKGROUND_WORKERS = 4  # Threads running network calls for the GUI
+UI_POLL_INTERVAL_MS = 15  # How often the Tk thread drains finished work
+UI_FRAME_BUDGET_MS = 8  # Time the Tk thread may spend on results per tick
+STREAM_FLUSH_MS = 50  # Minimum gap between streamed text updates
+
+# Instrumentation
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # Seconds
+METRICS_PROMETHEUS_FILE = "metrics.prom"
+METRICS_JSON_FILE = "metrics.json"
+OPENAI_TOKEN_PRICES = {  # model: (USD per 1K prompt tokens, USD per 1K completion tokens)
+    ARTICLE_MODEL: (0.0005, 0.0015),
+}
+OPENAI_IMAGE_PRICES = {  # (model, size): USD per image
+    (IMAGE_MODEL, "256x256"): 0.016,
+    (IMAGE_MODEL, "512x512"): 0.018,
+    (IMAGE_MODEL, "1024x1024"): 0.020,
+}
+
+def ensure_folders_exist():
+    """Ensure all required folders exist"""
+    os.makedirs(IMAGE_FOLDER, exist_ok=True)
+    os.makedirs(ARTICLES_FOLDER, exist_ok=True)
+
+def load_api_key():
+    """Load the OpenAI API key from file"""
+    if os.path.exists(API_KEY_FILE):
+        with open(API_KEY_FILE, 'r') as f:
+            return f.read().strip()
     return None
\ No newline at end of file
@@ -0,0 +1,283 @@
+# duplicates.py
+import argparse
+import hashlib
+import re
+import sys
+import time
+from array import array
+from config import (
+    DUPLICATE_INDEX_FILE, DUPLICATE_THRESHOLD, SHINGLE_SIZE, MINHASH_PERMUTATIONS, LSH_BANDS, ensure_folders_exist
+)
+from wordpress import split_article
+from artifacts import ArtifactStore
+from sqlite_store import SQLiteStore
+
+MAX_HASH = (1 << 32) - 1
+MINHASH_SEED = 1  # Signatures are only comparable when made with the same seed
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    prompt TEXT,
+    title TEXT,
+    owner TEXT,
+    signature BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_signatures_sha ON signatures (sha256);
+CREATE INDEX IF NOT EXISTS idx_signatures_owner ON signatures (owner);
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    signature_id INTEGER NOT NULL,
+    PRIMARY KEY (band, bucket, signature_id)
+) WITHOUT ROWID;
+"""
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Return the set of overlapping size-word runs in text, ignoring case and punctuation"""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures and LSH band keys for texts.
+
+    Two signatures agree in any one position with probability equal to
+    the Jaccard similarity of the texts' shingle sets, so comparing
+    signatures estimates similarity without keeping the texts. Each
+    signature is cut into bands; texts whose values match over a whole
+    band share that band's bucket, which finds likely matches with one
+    indexed lookup per band instead of a comparison with every stored
+    article.
+
+    Signatures use one-permutation hashing: every shingle is hashed once
+    and the hash picks both the position it competes for and its value,
+    so a signature costs one hash per shingle rather than one per
+    shingle and permutation. Positions no shingle fell into borrow the
+    next filled one (densification), which keeps short texts comparable.
+    """
+
+    def __init__(self, permutations=MINHASH_PERMUTATIONS, bands=LSH_BANDS, shingle_size=SHINGLE_SIZE,
+                 seed=MINHASH_SEED):
+        if permutations % bands:
+            raise ValueError("MinHash permutations must split evenly into LSH bands")
+        self.permutations = permutations
+        self.bands = bands
+        self.rows = permutations // bands
+        self.shingle_size = shingle_size
+        self._key = seed.to_bytes(8, 'little')
+
+    def signature(self, text):
+        """Return the MinHash signature of text as an array of 32-bit ints"""
+        size = self.permutations
+        slots = [None] * size
+        for shingle in shingles(text, self.shingle_size):
+            h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8, key=self._key).digest(),
+                               'little')
+            position, value = h % size, (h // size) & MAX_HASH
+            if slots[position] is None or value < slots[position]:
+                slots[position] = value
+        filled = [position for position, value in enumerate(slots) if value is not None]
+        if not filled:
+            return array('I', [MAX_HASH] * size)
+        if len(filled) < size:
+            # Each empty position takes the value of the next filled one, offset by the distance
+            following = filled[0] + size
+            for position in reversed(range(size)):
+                if slots[position] is not None:
+                    following = position
+                else:
+                    slots[position] = (slots[following % size] + (following - position) * 0x9E3779B1) & MAX_HASH
+        return array('I', slots)
+
+    def band_keys(self, signature):
+        """Return the (band, bucket) pairs a signature is filed under"""
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            keys.append((band, int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), 'little', signed=True)))
+        return keys
+
+    @staticmethod
+    def similarity(first, second):
+        """Estimate the Jaccard similarity of the texts behind two signatures"""
+        return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+class DuplicateMatch:
+    """An indexed article that a new one nearly duplicates"""
+
+    def __init__(self, signature_id, sha256, prompt, title, similarity):
+        self.signature_id = signature_id
+        self.sha256 = sha256  # Matches ArtifactStore's article_sha256
+        self.prompt = prompt
+        self.title = title
+        self.similarity = similarity
+
+    def __str__(self):
+        return f"{self.similarity:.0%} similar to \"{self.title}\" (prompt: {self.prompt})"
+
+
+class DuplicateArticleError(ValueError):
+    """Raised when an article is rejected as a near-duplicate of an earlier one"""
+
+    def __init__(self, match):
+        super().__init__(f"Near-duplicate article: {match}")
+        self.match = match
+
+
+class DuplicateIndex(SQLiteStore):
+    """Persistent MinHash LSH index of posted articles.
+
+    The pipeline and job workers add articles as they pass the check,
+    ahead of posting them, and the GUI once it has posted.
+
+    Each article's signature is stored once and filed under one bucket
+    per band, so a lookup costs LSH_BANDS primary-key searches plus a
+    signature comparison for each candidate found, however large the
+    archive grows. Connections are per thread in WAL mode, as in
+    MediaIndex; check() looks up and adds in one transaction, so
+    parallel workers cannot both let through two copies of the same
+    article.
+    """
+
+    def __init__(self, path=DUPLICATE_INDEX_FILE, threshold=DUPLICATE_THRESHOLD, hasher=None):
+        super().__init__(path)
+        self.threshold = threshold
+        self.hasher = hasher or MinHasher()
+        self._connect().executescript(SCHEMA)
+
+    def find(self, article, threshold=None):
+        """Return DuplicateMatches for indexed articles at least threshold similar, most similar first"""
+        signature = self.hasher.signature(article)
+        return self._matches(self._connect(), signature, self.hasher.band_keys(signature), threshold)
+
+    def add(self, prompt, article):
+        """Index an article and return its signature id"""
+        signature = self.hasher.signature(article)
+        return self._insert(self._connect(), prompt, article, signature, self.hasher.band_keys(signature))
+
+    def check(self, prompt, article, add_duplicates=False, owner=None):
+        """Look up a new article and index it; returns (closest DuplicateMatch or None, signature id).
+
+        A duplicate is only added with add_duplicates, for duplicates that
+        will be posted anyway; its signature id is None otherwise.
+
+        owner names whatever the article belongs to, such as a job. Entries
+        with the same owner never match and are not added twice, so
+        checking the same job again after a crash or retry is harmless.
+        """
+        # The CPU-heavy signature is made before taking the write lock
+        signature = self.hasher.signature(article)
+        keys = self.hasher.band_keys(signature)
+        with self.transaction() as conn:
+            matches = self._matches(conn, signature, keys, owner=owner)
+            signature_id = None
+            if owner is not None:
+                row = conn.execute("SELECT id FROM signatures WHERE owner = ?", (owner,)).fetchone()
+                signature_id = row[0] if row else None
+            if signature_id is None and (add_duplicates or not matches):
+                signature_id = self._insert(conn, prompt, article, signature, keys, owner)
+        return (matches[0] if matches else None), signature_id
+
+    def remove(self, signature_id):
+        """Forget an article, e.g. one that failed before it was posted"""
+        self._delete("id = ?", signature_id)
+
+    def remove_owner(self, owner):
+        """Forget the article checked under owner, if any"""
+        self._delete("owner = ?", owner)
+
+    def _delete(self, condition, value):
+        with self.transaction() as conn:
+            conn.execute(
+                f"DELETE FROM buckets WHERE signature_id IN (SELECT id FROM signatures WHERE {condition})", (value,)
+            )
+            conn.execute(f"DELETE FROM signatures WHERE {condition}", (value,))
+
+    def clear(self):
+        """Forget every article"""
+        conn = self._connect()
+        conn.execute("DELETE FROM buckets")
+        conn.execute("DELETE FROM signatures")
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def _matches(self, conn, signature, keys, threshold=None, owner=None):
+        threshold = self.threshold if threshold is None else threshold
+        values = ", ".join("(?, ?)" for _ in keys)
+        # CROSS JOIN keeps SQLite probing the bucket key for each band rather than scanning buckets
+        candidates = conn.execute(
+            f"WITH probe (band, bucket) AS (VALUES {values}) "
+            "SELECT DISTINCT signatures.id, sha256, prompt, title, signature FROM probe "
+            "CROSS JOIN buckets ON buckets.band = probe.band AND buckets.bucket = probe.bucket "
+            "JOIN signatures ON signatures.id = buckets.signature_id WHERE ? IS NULL OR owner IS NOT ?",
+            [value for key in keys for value in key] + [owner, owner]
+        ).fetchall()
+        matches = []
+        for signature_id, sha256, prompt, title, stored in candidates:
+            similarity = self.hasher.similarity(signature, array('I', stored))
+            if similarity >= threshold:
+                matches.append(DuplicateMatch(signature_id, sha256, prompt, title, similarity))
+        matches.sort(key=lambda match: match.similarity, reverse=True)
+        return matches
+
+    @staticmethod
+    def _insert(conn, prompt, article, signature, keys, owner=None):
+        cursor = conn.execute(
+            "INSERT INTO signatures (sha256, prompt, title, owner, signature, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (hashlib.sha256(article.encode('utf-8')).hexdigest(), prompt, split_article(article)[0], owner,
+             signature.tobytes(), time.time())
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO buckets (band, bucket, signature_id) VALUES (?, ?, ?)",
+            [(band, bucket, cursor.lastrowid) for band, bucket in keys]
+        )
+        return cursor.lastrowid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find near-duplicate articles with a MinHash LSH index")
+    parser.add_argument("--db", default=DUPLICATE_INDEX_FILE, help="Duplicate index file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    check = commands.add_parser("check", help="List indexed articles similar to the article in a file")
+    check.add_argument("article", help="Text file with the article")
+    check.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD)
+
+    commands.add_parser("rebuild", help="Re-index every posted article in the artifact store")
+
+    args = parser.parse_args(argv)
+    index = DuplicateIndex(args.db)
+
+    if args.command == "check":
+        with open(args.article, 'r', encoding='utf-8') as f:
+            article = f.read()
+        started = time.perf_counter()
+        matches = index.find(article, args.threshold)
+        elapsed = (time.perf_counter() - started) * 1000
+        for match in matches:
+            print(f"{match.signature_id:>7}  {match}")
+        print(f"{len(matches)} of {len(index)} indexed articles match ({elapsed:.1f} ms)")
+        return 1 if matches else 0
+    elif args.command == "rebuild":
+        ensure_folders_exist()
+        store = ArtifactStore()
+        index.clear()
+        artifacts = store.find(posted=True, limit=-1)
+        for artifact in reversed(artifacts):  # Oldest first, as they were generated
+            index.add(artifact['prompt'], store.load_article(artifact['id']))
+        print(f"Indexed {len(artifacts)} articles")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
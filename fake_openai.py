@@ -0,0 +1,302 @@
+# fake_openai.py
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from io import BytesIO
+from PIL import Image
+from ratelimit import TokenBucket
+
+WORDS = (
+    "garden soil water light season plant root growth compost harvest tool shade "
+    "seed bloom leaf pest mulch sun rain frost bed path yield crop herb tree"
+).split()
+
+
+class FakeOpenAISettings:
+    """Knobs controlling how the fake server behaves"""
+
+    def __init__(self, latency=0.2, token_rate=200.0, completion_tokens=420, image_latency=1.0,
+                 error_rate=0.0, requests_per_minute=None, tokens_per_minute=None, images_per_minute=None,
+                 seed=0):
+        self.latency = latency  # Seconds before the first token / image byte
+        self.token_rate = token_rate  # Completion tokens produced per second
+        self.completion_tokens = completion_tokens  # Words in each generated article
+        self.image_latency = image_latency  # Seconds to "render" an image
+        self.error_rate = error_rate  # Fraction of requests answered with a 500
+        self.requests_per_minute = requests_per_minute  # None disables request throttling
+        self.tokens_per_minute = tokens_per_minute  # None disables token throttling
+        self.images_per_minute = images_per_minute  # None disables image throttling
+        self.seed = seed
+
+
+class FakeOpenAIServer:
+    """Local stand-in for the chat completion and image generation endpoints.
+
+    Responses are derived from a hash of the request, so the same prompt
+    always yields the same article and image. Latency, token rate, error
+    rate and rate limiting (with x-ratelimit-* headers and 429s) are
+    configurable, which makes AIServices measurable without real calls:
+
+        with FakeOpenAIServer(FakeOpenAISettings(latency=0.5)) as server:
+            ai = AIServices(api_base=server.api_base, api_key="test")
+    """
+
+    def __init__(self, settings=None, host="127.0.0.1", port=0):
+        self.settings = settings or FakeOpenAISettings()
+        self.stats = {'requests': 0, 'throttled': 0, 'errors': 0, 'completion_tokens': 0, 'images': 0}
+        self._lock = threading.Lock()
+        self._random = random.Random(self.settings.seed)
+        # Like OpenAI, chat and images are limited separately
+        self._buckets = {
+            'chat': (self._bucket(self.settings.requests_per_minute), self._bucket(self.settings.tokens_per_minute)),
+            'images': (self._bucket(self.settings.images_per_minute), None),
+        }
+        self._images = {}
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @staticmethod
+    def _bucket(limit):
+        return TokenBucket(limit) if limit else None
+
+    @property
+    def api_base(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    # --- Content ---
+    def article_for(self, prompt):
+        """Deterministic article text for a prompt"""
+        rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).digest())
+        key_phrase = " ".join(rng.sample(WORDS, 2))
+        words = [rng.choice(WORDS) for _ in range(self.settings.completion_tokens)]
+        paragraphs = [" ".join(words[i:i + 60]).capitalize() + "." for i in range(0, len(words), 60)]
+        return "\n".join([
+            f"{key_phrase.title()} Guide for Every Season",
+            key_phrase,
+            *paragraphs,
+            f"Meta description: A practical {key_phrase} guide with simple steps for better results.",
+        ])
+
+    def image_for(self, prompt, size):
+        """Deterministic base64 PNG of the requested size"""
+        color = tuple(hashlib.sha256(prompt.encode('utf-8')).digest()[:3])
+        key = (size, color)
+        with self._lock:
+            encoded = self._images.get(key)
+        if encoded is None:
+            width, height = (int(n) for n in size.split("x"))
+            buffer = BytesIO()
+            Image.new("RGB", (width, height), color).save(buffer, format="PNG")
+            encoded = base64.b64encode(buffer.getvalue()).decode('ascii')
+            with self._lock:
+                self._images[key] = encoded
+        return encoded
+
+    # --- Throttling ---
+    def _admit(self, endpoint, tokens):
+        """Return (status, headers) for a new request to 'chat' or 'images'"""
+        requests_bucket, tokens_bucket = self._buckets[endpoint]
+        with self._lock:
+            self.stats['requests'] += 1
+            now = time.monotonic()
+            headers = {}
+            throttled = False
+            for name, bucket, amount in (('requests', requests_bucket, 1), ('tokens', tokens_bucket, tokens)):
+                if bucket is None:
+                    continue
+                bucket.refill(now)
+                if bucket.level < amount:
+                    throttled = True
+                    reset = (amount - bucket.level) / bucket.rate
+                    headers[f'x-ratelimit-reset-{name}'] = f"{int(reset * 1000)}ms"
+                    headers['retry-after'] = f"{reset:.3f}"
+            if not throttled:
+                for bucket, amount in ((requests_bucket, 1), (tokens_bucket, tokens)):
+                    if bucket is not None:
+                        bucket.level -= amount
+            for name, bucket in (('requests', requests_bucket), ('tokens', tokens_bucket)):
+                if bucket is not None:
+                    headers[f'x-ratelimit-limit-{name}'] = str(bucket.limit)
+                    headers[f'x-ratelimit-remaining-{name}'] = str(max(0, int(bucket.level)))
+
+            if throttled:
+                self.stats['throttled'] += 1
+                return 429, headers
+            if self.settings.error_rate and self._random.random() < self.settings.error_rate:
+                self.stats['errors'] += 1
+                return 500, headers
+            return 200, headers
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_chunk(self, data):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return self.send_json(400, {'error': {'message': "Invalid JSON", 'type': "invalid_request_error"}})
+
+                if self.path.endswith("/chat/completions"):
+                    self.chat(request)
+                elif self.path.endswith("/images/generations"):
+                    self.image(request)
+                else:
+                    self.send_json(404, {'error': {'message': f"Unknown path {self.path}", 'type': "invalid_request_error"}})
+
+            def reject(self, status, headers):
+                if status == 429:
+                    message, kind = "Rate limit reached", "requests"
+                else:
+                    message, kind = "The server had an error while processing your request", "server_error"
+                self.send_json(status, {'error': {'message': message, 'type': kind}}, headers)
+
+            def chat(self, request):
+                messages = request.get('messages', [])
+                prompt = messages[-1]['content'] if messages else ""
+                prompt_tokens = sum(len(m.get('content', "")) // 4 for m in messages)
+                article = server.article_for(prompt)
+                completion_tokens = len(article.split())
+
+                status, headers = server._admit('chat', prompt_tokens + completion_tokens)
+                if status != 200:
+                    return self.reject(status, headers)
+                with server._lock:
+                    server.stats['completion_tokens'] += completion_tokens
+
+                settings = server.settings
+                time.sleep(settings.latency)
+                if not request.get('stream'):
+                    time.sleep(completion_tokens / settings.token_rate)
+                    return self.send_json(200, {
+                        'id': "chatcmpl-fake",
+                        'object': "chat.completion",
+                        'created': int(time.time()),
+                        'model': request.get('model'),
+                        'choices': [{
+                            'index': 0,
+                            'message': {'role': "assistant", 'content': article},
+                            'finish_reason': "stop",
+                        }],
+                        'usage': {
+                            'prompt_tokens': prompt_tokens,
+                            'completion_tokens': completion_tokens,
+                            'total_tokens': prompt_tokens + completion_tokens,
+                        },
+                    }, headers)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                # Stream word by word with leading whitespace so the deltas join back exactly
+                for delta in re.findall(r"\s*\S+", article):
+                    event = {
+                        'id': "chatcmpl-fake",
+                        'object': "chat.completion.chunk",
+                        'model': request.get('model'),
+                        'choices': [{'index': 0, 'delta': {'content': delta}, 'finish_reason': None}],
+                    }
+                    self.send_chunk(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                    time.sleep(1 / settings.token_rate)
+                self.send_chunk(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def image(self, request):
+                status, headers = server._admit('images', 0)
+                if status != 200:
+                    return self.reject(status, headers)
+                time.sleep(server.settings.image_latency)
+                encoded = server.image_for(request.get('prompt', ""), request.get('size', "512x512"))
+                with server._lock:
+                    server.stats['images'] += 1
+                self.send_json(200, {
+                    'created': int(time.time()),
+                    'data': [{'b64_json': encoded} for _ in range(request.get('n', 1))],
+                }, headers)
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local fake of the OpenAI endpoints used by AIServices")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Completion tokens per second")
+    parser.add_argument("--completion-tokens", type=int, default=420, help="Words per article")
+    parser.add_argument("--image-latency", type=float, default=1.0, help="Seconds per image")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument("--rpm", type=int, help="Requests per minute before 429s")
+    parser.add_argument("--tpm", type=int, help="Tokens per minute before 429s")
+    parser.add_argument("--ipm", type=int, help="Images per minute before 429s")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    settings = FakeOpenAISettings(
+        latency=args.latency,
+        token_rate=args.token_rate,
+        completion_tokens=args.completion_tokens,
+        image_latency=args.image_latency,
+        error_rate=args.error_rate,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        images_per_minute=args.ipm,
+        seed=args.seed
+    )
+    server = FakeOpenAIServer(settings, args.host, args.port)
+    print(f"Fake OpenAI listening on {server.api_base}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
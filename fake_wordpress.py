@@ -0,0 +1,342 @@
+# fake_wordpress.py
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+BATCH_MAX_REQUESTS = 25  # WordPress core's limit for /batch/v1
+
+
+class FakeWordPressSettings:
+    """Knobs controlling how the fake WordPress site behaves"""
+
+    def __init__(self, latency=0.05, upload_latency=0.2, error_rate=0.0, throttle_every=0,
+                 retry_after=1, categories=250, supports_batch=True, username="user", password="pass", seed=0):
+        self.latency = latency  # Seconds added to every request
+        self.upload_latency = upload_latency  # Extra seconds for media uploads
+        self.error_rate = error_rate  # Fraction of requests answered with a 500
+        self.throttle_every = throttle_every  # Answer every Nth request with a 429 (0 disables)
+        self.retry_after = retry_after  # Retry-After seconds sent with 429s
+        self.categories = categories  # Number of categories the site has
+        self.supports_batch = supports_batch  # False answers /batch/v1 with 404 like WordPress < 5.6
+        self.username = username
+        self.password = password
+        self.seed = seed
+
+
+class FakeWordPressServer:
+    """Local stand-in for the WordPress REST endpoints WordPressClient uses.
+
+    Implements /wp-json/wp/v2/media, /posts and /categories (paginated with
+    X-WP-Total/X-WP-TotalPages, _fields and ETag revalidation) plus
+    /wp-json/batch/v1. Latency, throttling and failures can be injected,
+    so the posting path can be benchmarked and tested offline:
+
+        with FakeWordPressServer() as server:
+            client = WordPressClient(wp_url=server.url, username="user", password="pass")
+    """
+
+    def __init__(self, settings=None, host="127.0.0.1", port=0):
+        self.settings = settings or FakeWordPressSettings()
+        self.stats = {'requests': 0, 'throttled': 0, 'errors': 0, 'uploads': 0, 'upload_bytes': 0,
+                      'posts': 0, 'batches': 0}
+        self.media = {}
+        self.posts = {}
+        self.categories = [
+            {'id': n, 'name': f"Category {n}", 'slug': f"category-{n}", 'parent': 0,
+             'description': "", 'count': 0, 'link': f"/category/category-{n}/"}
+            for n in range(1, self.settings.categories + 1)
+        ]
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._random = random.Random(self.settings.seed)
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _new_id(self):
+        with self._lock:
+            new_id = self._next_id
+            self._next_id += 1
+            return new_id
+
+    def _admit(self):
+        """Return 200, 429 or 500 for a new request"""
+        with self._lock:
+            self.stats['requests'] += 1
+            every = self.settings.throttle_every
+            if every and self.stats['requests'] % every == 0:
+                self.stats['throttled'] += 1
+                return 429
+            if self.settings.error_rate and self._random.random() < self.settings.error_rate:
+                self.stats['errors'] += 1
+                return 500
+            return 200
+
+    def categories_etag(self):
+        digest = hashlib.sha256(json.dumps(self.categories).encode('utf-8')).hexdigest()
+        return f'"{digest[:16]}"'
+
+    # --- Resources ---
+    def create_media(self, filename, content_type, size):
+        media_id = self._new_id()
+        item = {
+            'id': media_id,
+            'title': {'rendered': filename},
+            'mime_type': content_type,
+            'source_url': f"{self.url}/wp-content/uploads/{filename}",
+            'media_details': {'filesize': size},
+        }
+        with self._lock:
+            self.media[media_id] = item
+            self.stats['uploads'] += 1
+            self.stats['upload_bytes'] += size
+        return item
+
+    def create_post(self, data):
+        if not data.get('title'):
+            return 400, {'code': "empty_content", 'message': "Content, title, and excerpt are empty.", 'data': {'status': 400}}
+        featured = data.get('featured_media')
+        if featured and featured not in self.media:
+            return 400, {'code': "rest_invalid_featured_media", 'message': "Invalid featured media ID.",
+                         'data': {'status': 400}}
+        post_id = self._new_id()
+        post = {
+            'id': post_id,
+            'title': {'raw': data['title'], 'rendered': data['title']},
+            'content': {'raw': data.get('content', ""), 'rendered': data.get('content', "")},
+            'status': data.get('status', "draft"),
+            'date': data.get('date'),
+            'categories': data.get('categories', []),
+            'featured_media': featured or 0,
+            'link': f"{self.url}/?p={post_id}",
+        }
+        with self._lock:
+            self.posts[post_id] = post
+            self.stats['posts'] += 1
+        return 201, post
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, payload, headers=None, head_only=False):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=UTF-8")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if not head_only:
+                    self.wfile.write(body)
+
+            def send_error_json(self, status, code, message, headers=None):
+                self.send_json(status, {'code': code, 'message': message, 'data': {'status': status}}, headers)
+
+            def read_body(self):
+                """Read a plain or chunked request body"""
+                if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                    chunks = []
+                    while True:
+                        size = int(self.rfile.readline().split(b";")[0], 16)
+                        if size == 0:
+                            self.rfile.readline()
+                            return b"".join(chunks)
+                        chunks.append(self.rfile.read(size))
+                        self.rfile.readline()
+                length = int(self.headers.get("Content-Length", 0))
+                return self.rfile.read(length)
+
+            def authorized(self):
+                expected = "Basic " + base64.b64encode(
+                    f"{server.settings.username}:{server.settings.password}".encode('utf-8')
+                ).decode('ascii')
+                return self.headers.get("Authorization") == expected
+
+            def route(self, method):
+                url = urlsplit(self.path)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                body = self.read_body() if method in ("POST", "PUT") else b""
+
+                time.sleep(server.settings.latency)
+                status = server._admit()
+                if status == 429:
+                    return self.send_error_json(429, "rest_too_many_requests", "Too many requests.",
+                                                {'Retry-After': str(server.settings.retry_after)})
+                if status == 500:
+                    return self.send_error_json(500, "internal_server_error", "There has been a critical error.")
+                if method != "GET" and method != "HEAD" and not self.authorized():
+                    return self.send_error_json(401, "rest_not_logged_in", "You are not currently logged in.")
+
+                path = url.path.rstrip("/")
+                if path == "/wp-json/wp/v2/categories" and method in ("GET", "HEAD"):
+                    return self.list_categories(query, method == "HEAD")
+                if path == "/wp-json/wp/v2/media" and method == "POST":
+                    return self.upload(body)
+                match = re.fullmatch(r"/wp-json/wp/v2/media/(\d+)", path)
+                if match and method in ("GET", "HEAD"):
+                    return self.get_media(int(match.group(1)), query, method == "HEAD")
+                if path == "/wp-json/wp/v2/posts" and method == "POST":
+                    status, payload = server.create_post(json.loads(body or b"{}"))
+                    return self.send_json(status, payload)
+                if path == "/wp-json/batch/v1" and method == "POST" and server.settings.supports_batch:
+                    return self.batch(json.loads(body or b"{}"))
+                self.send_error_json(404, "rest_no_route", "No route was found matching the URL and request method.")
+
+            def do_GET(self):
+                self.route("GET")
+
+            def do_HEAD(self):
+                self.route("HEAD")
+
+            def do_POST(self):
+                self.route("POST")
+
+            def list_categories(self, query, head_only):
+                etag = server.categories_etag()
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("X-WP-Total", str(len(server.categories)))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                per_page = min(int(query.get('per_page', 10)), 100)
+                page = int(query.get('page', 1))
+                total = len(server.categories)
+                total_pages = max(1, -(-total // per_page))
+                if page > total_pages:
+                    return self.send_error_json(400, "rest_post_invalid_page_number",
+                                                "The page number requested is larger than the number of pages available.")
+                items = server.categories[(page - 1) * per_page:page * per_page]
+                fields = query.get('_fields')
+                if fields:
+                    wanted = fields.split(",")
+                    items = [{key: item[key] for key in wanted if key in item} for item in items]
+                self.send_json(200, items, {
+                    'X-WP-Total': str(total),
+                    'X-WP-TotalPages': str(total_pages),
+                    'ETag': etag,
+                }, head_only)
+
+            def upload(self, body):
+                time.sleep(server.settings.upload_latency)
+                content_type = self.headers.get("Content-Type", "")
+                disposition = self.headers.get("Content-Disposition", "")
+                if content_type.startswith("multipart/form-data"):
+                    # Pull the file part's headers out of the multipart body
+                    header_end = body.find(b"\r\n\r\n")
+                    part_headers = body[:header_end].decode('utf-8', 'replace')
+                    disposition = part_headers
+                    match = re.search(r"Content-Type:\s*([^\r\n]+)", part_headers, re.IGNORECASE)
+                    content_type = match.group(1).strip() if match else "application/octet-stream"
+                    # The file data sits between the part headers and "\r\n--boundary--\r\n"
+                    boundary_line = body[:body.find(b"\r\n")]
+                    size = len(body) - (header_end + 4) - (len(boundary_line) + 6)
+                else:
+                    size = len(body)
+
+                match = re.search(r'filename="?([^";\r\n]+)"?', disposition)
+                if not match or not size:
+                    return self.send_error_json(400, "rest_upload_no_data", "No data supplied.")
+                item = server.create_media(match.group(1), content_type, size)
+                self.send_json(201, item)
+
+            def get_media(self, media_id, query, head_only):
+                item = server.media.get(media_id)
+                if item is None:
+                    return self.send_error_json(404, "rest_post_invalid_id", "Invalid post ID.")
+                fields = query.get('_fields')
+                if fields:
+                    item = {key: item[key] for key in fields.split(",") if key in item}
+                self.send_json(200, item, head_only=head_only)
+
+            def batch(self, payload):
+                requests = payload.get('requests', [])
+                if len(requests) > BATCH_MAX_REQUESTS:
+                    return self.send_error_json(
+                        400, "rest_invalid_param",
+                        f"Invalid parameter(s): requests (must contain at most {BATCH_MAX_REQUESTS} items)"
+                    )
+                with server._lock:
+                    server.stats['batches'] += 1
+                responses = []
+                for request in requests:
+                    if request.get('method', "POST") == "POST" and request.get('path') == "/wp/v2/posts":
+                        status, body = server.create_post(request.get('body', {}))
+                    else:
+                        status, body = 404, {'code': "rest_no_route", 'message': "No route was found.",
+                                             'data': {'status': 404}}
+                    responses.append({'body': body, 'status': status, 'headers': {}})
+                self.send_json(207, {'responses': responses})
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local fake of the WordPress REST API used by WordPressClient")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every request")
+    parser.add_argument("--upload-latency", type=float, default=0.2, help="Extra seconds per media upload")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument("--throttle-every", type=int, default=0, help="Answer every Nth request with 429")
+    parser.add_argument("--categories", type=int, default=250, help="Number of categories on the site")
+    parser.add_argument("--no-batch", action="store_true", help="Behave like WordPress without /batch/v1")
+    parser.add_argument("--username", default="user")
+    parser.add_argument("--password", default="pass")
+    args = parser.parse_args(argv)
+
+    settings = FakeWordPressSettings(
+        latency=args.latency,
+        upload_latency=args.upload_latency,
+        error_rate=args.error_rate,
+        throttle_every=args.throttle_every,
+        categories=args.categories,
+        supports_batch=not args.no_batch,
+        username=args.username,
+        password=args.password
+    )
+    server = FakeWordPressServer(settings, args.host, args.port)
+    print(f"Fake WordPress listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
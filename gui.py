@@ -1,270 +1,617 @@
-# gui.py
-import tkinter as tk
-from tkinter import scrolledtext, messagebox, simpledialog, ttk
-from tkcalendar import DateEntry
-from PIL import ImageTk
-import os
-import datetime
-from config import ensure_folders_exist, WP_CONFIG_FILE, IMAGE_FOLDER
-from ai_services import AIServices
-from wordpress import WordPressClient
-
-
-class ArticleApp:
-    def __init__(self, root):
-        self.root = root
-        self.ai = AIServices()
-        self.wp_client = WordPressClient()
-        self.current_image = None
-        self.categories = []  # All categories fetched from WordPress
-        self.category_vars = {}  # Checkbutton variables for selected categories
-        self.status_var = tk.StringVar()  # Status bar variable
-        ensure_folders_exist()
-        self.initialize_components()
-        self.load_categories()
-
-    def update_status(self, message):
-        """Update the status bar text"""
-        self.status_var.set(message)
-        self.root.update_idletasks()
-
-    def initialize_components(self):
-        """Initialize all UI components in proper order"""
-        self.create_menu()
-        self.setup_gui()
-        self.create_status_bar()
-        self.add_publish_date_controls()
-
-    # --- Core GUI Components ---
-    def setup_gui(self):
-        """Set up the main GUI components"""
-        self.root.title("Article Generator")
-        self.root.geometry("800x600")
-
-        main_frame = tk.Frame(self.root)
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-
-        # Input Section
-        input_frame = tk.Frame(main_frame)
-        input_frame.pack(fill=tk.X, pady=5)
-
-        tk.Label(input_frame, text="Enter Prompt:").pack(side=tk.LEFT)
-        self.prompt_entry = tk.Entry(input_frame, width=50)
-        self.prompt_entry.pack(side=tk.LEFT, padx=5)
-
-        # Output Section
-        self.output_text = scrolledtext.ScrolledText(main_frame, wrap=tk.WORD)
-        self.output_text.pack(fill=tk.BOTH, expand=True)
-
-        # Category Section
-        category_frame = tk.LabelFrame(main_frame, text="Select Categories")
-        category_frame.pack(fill=tk.BOTH, padx=10, pady=5)
-
-        self.category_canvas = tk.Canvas(category_frame)
-        self.category_scrollbar = ttk.Scrollbar(
-            category_frame, orient=tk.VERTICAL, command=self.category_canvas.yview
-        )
-        self.category_inner_frame = tk.Frame(self.category_canvas)
-
-        self.category_inner_frame.bind(
-            "<Configure>",
-            lambda e: self.category_canvas.configure(scrollregion=self.category_canvas.bbox("all")),
-        )
-
-        self.category_canvas.create_window((0, 0), window=self.category_inner_frame, anchor="nw")
-        self.category_canvas.configure(yscrollcommand=self.category_scrollbar.set)
-
-        self.category_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        self.category_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-        # Bottom Buttons
-        button_frame = tk.Frame(main_frame)
-        button_frame.pack(fill=tk.X, pady=5)
-
-        tk.Button(button_frame, text="Generate", command=self.generate).pack(side=tk.LEFT, padx=5)
-        tk.Button(button_frame, text="Post to WordPress", command=self.post_to_wordpress).pack(side=tk.LEFT, padx=5)
-        tk.Button(button_frame, text="Clear", command=self.clear).pack(side=tk.LEFT, padx=5)
-
-    def create_status_bar(self):
-        """Create status bar at bottom of window"""
-        status_bar = tk.Label(self.root,
-                              textvariable=self.status_var,
-                              bd=1,
-                              relief=tk.SUNKEN,
-                              anchor=tk.W)
-        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
-        self.status_var.set("Ready")
-
-    # --- Date/Time Picker ---
-    def add_publish_date_controls(self):
-        """Add datetime picker to GUI"""
-        date_frame = tk.Frame(self.root)
-        date_frame.pack(pady=5)
-
-        tk.Label(date_frame, text="Publish Date:").pack(side=tk.LEFT)
-        self.publish_date = DateEntry(date_frame)
-        self.publish_date.pack(side=tk.LEFT, padx=5)
-
-        tk.Label(date_frame, text="Time:").pack(side=tk.LEFT)
-        self.publish_time = tk.Spinbox(
-            date_frame,
-            values=[f"{h:02d}:{m:02d}" for h in range(24) for m in [0, 15, 30, 45]]
-        )
-        self.publish_time.pack(side=tk.LEFT)
-
-        tk.Label(date_frame, text="(Server Timezone)").pack(side=tk.LEFT, padx=5)
-
-    def create_menu(self):
-        """Create menu bar"""
-        menubar = tk.Menu(self.root)
-
-        # File Menu
-        file_menu = tk.Menu(menubar, tearoff=0)
-        file_menu.add_command(label="Exit", command=self.root.quit)
-        menubar.add_cascade(label="File", menu=file_menu)
-
-        # Settings Menu
-        settings_menu = tk.Menu(menubar, tearoff=0)
-        settings_menu.add_command(label="API Key", command=self.set_api_key)
-        settings_menu.add_command(label="WordPress Config", command=self.configure_wordpress)
-        menubar.add_cascade(label="Settings", menu=settings_menu)
-
-        self.root.config(menu=menubar)
-
-    # --- Core Functionality ---
-    def load_categories(self):
-        """Load categories from WordPress"""
-        try:
-            self.update_status("Loading categories...")
-            self.categories = self.wp_client.get_categories()
-
-            # Clear existing checkboxes
-            for widget in self.category_inner_frame.winfo_children():
-                widget.destroy()
-
-            # Create new checkboxes
-            self.category_vars = {}
-            for category in self.categories:
-                var = tk.BooleanVar()
-                cb = tk.Checkbutton(
-                    self.category_inner_frame,
-                    text=category['name'],
-                    variable=var
-                )
-                cb.pack(anchor="w")
-                self.category_vars[category['id']] = var
-
-            self.update_status("Categories loaded")
-        except Exception as e:
-            messagebox.showerror("Category Error", f"Failed to load categories: {str(e)}")
-            self.update_status("Category load failed")
-
-    def generate(self):
-        """Generate article and image using AI"""
-        prompt = self.prompt_entry.get()
-        if not prompt:
-            messagebox.showwarning("Warning", "Please enter a prompt")
-            return
-
-        try:
-            # Load rules from the rules.txt file
-            with open("rules.txt", "r") as file:
-                rules = file.read().strip()
-
-            self.update_status("Generating article...")
-            combined_input = f"Rules:\n{rules}\n\nPrompt:\n{prompt}"
-            article = self.ai.generate_article(combined_input)
-            self.output_text.delete(1.0, tk.END)
-            self.output_text.insert(tk.END, article)
-
-            self.update_status("Generating image...")
-            self.current_image = self.ai.generate_image(prompt)
-            self.display_image()
-
-            self.update_status("Ready")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-            self.update_status("Error occurred")
-
-    def post_to_wordpress(self):
-        """Post the generated content to WordPress"""
-        article_content = self.output_text.get(1.0, tk.END).strip()
-        if not article_content:
-            messagebox.showwarning("Warning", "No content to post. Please generate an article first.")
-            return
-
-        try:
-            # Extract the title from the first line of the content
-            lines = article_content.split("\n", 1)
-            title = lines[0].strip() if len(lines) > 0 else "Generated Article"
-            content_body = lines[1].strip() if len(lines) > 1 else article_content
-
-            # Get selected categories
-            selected_categories = [
-                cat_id for cat_id, var in self.category_vars.items() if var.get()
-            ]
-
-            self.update_status("Posting to WordPress...")
-            publish_date = self.publish_date.get_date()
-            publish_time = self.publish_time.get()
-            full_datetime = datetime.datetime.strptime(f"{publish_date} {publish_time}", "%Y-%m-%d %H:%M").isoformat()
-
-            # Use the create_post method of WordPressClient
-            response = self.wp_client.create_post(
-                title=title,
-                content=content_body,
-                categories=selected_categories,
-                schedule_time=full_datetime
-            )
-            messagebox.showinfo("Success", f"Article posted to WordPress! Post ID: {response['id']}")
-            self.update_status("Ready")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to post to WordPress: {e}")
-            self.update_status("Error occurred")
-
-    def clear(self):
-        """Clear all input and output fields"""
-        self.prompt_entry.delete(0, tk.END)
-        self.output_text.delete(1.0, tk.END)
-        self.publish_date.set_date(datetime.datetime.now())
-        self.publish_time.delete(0, tk.END)
-        self.publish_time.insert(0, "00:00")
-        self.current_image = None
-        for var in self.category_vars.values():
-            var.set(False)
-        self.update_status("Ready")
-
-    def set_api_key(self):
-        """Set or update the OpenAI API key"""
-        key_file = "openai_api_key.txt"
-
-        if os.path.exists(key_file):
-            with open(key_file, "r") as file:
-                current_key = file.read().strip()
-        else:
-            current_key = ""
-
-        new_key = simpledialog.askstring("Set API Key", "Enter your OpenAI API Key:", initialvalue=current_key)
-
-        if new_key:
-            with open(key_file, "w") as file:
-                file.write(new_key)
-            messagebox.showinfo("Success", "API Key updated successfully!")
-        else:
-            messagebox.showwarning("Warning", "API Key update canceled.")
-
-    def configure_wordpress(self):
-        """Placeholder for WordPress configuration"""
-        messagebox.showinfo("WordPress Config", "WordPress configuration not yet implemented.")
-
-    def display_image(self):
-        """Display generated image (implementation missing in original code)"""
-        # Add your image display logic here
-        pass
-
-
-# Main execution block
-if __name__ == "__main__":
-    root = tk.Tk()
-    app = ArticleApp(root)
+# gui.py
+import tkinter as tk
+from tkinter import scrolledtext, messagebox, simpledialog, ttk
+from tkcalendar import DateEntry
+from PIL import ImageTk
+import os
+import datetime
+import logging
+import time
+from config import ensure_folders_exist, WP_CONFIG_FILE, IMAGE_FOLDER, STREAM_FLUSH_MS, DUPLICATE_CHECK_ENABLED
+from ai_services import AIServices
+from wordpress import WordPressClient, split_article
+from tasks import BackgroundRunner
+from category_cache import CategoryCache, diff_categories
+from metrics import get_metrics
+from artifacts import ArtifactStore
+from duplicates import DuplicateIndex
+
+logger = logging.getLogger(__name__)
+
+
+class ArticleApp:
+    def __init__(self, root):
+        self.root = root
+        self.ai = AIServices()
+        self.wp_client = WordPressClient()
+        self.current_image = None
+        self.current_prompt = None
+        self.current_article = None
+        self.current_artifact_id = None  # Archive entry of the last generation
+        self.current_image_path = None  # Where that generation's image was stored
+        self.categories = []  # All categories fetched from WordPress
+        self.category_vars = {}  # Checkbutton variables for selected categories
+        self.category_widgets = {}  # Checkbuttons by category id
+        self.category_render = None  # Pending root.after call that adds the next chunk of checkboxes
+        self.category_cache = CategoryCache(self.wp_client.wp_url)
+        self.status_var = tk.StringVar()  # Status bar variable
+        self.runner = BackgroundRunner(root)  # Runs network calls off the Tk thread
+        self.generation_jobs = []  # Jobs of the generation in progress
+        self.generation_pending = 0  # Generation jobs that have not reported back
+        self.generation = 0  # Bumped for each new generation so late archive results can be told apart
+        self.archive_job = None  # Archiving of the current generation, while it runs
+        ensure_folders_exist()
+        self.artifacts = ArtifactStore()
+        self.duplicates = DuplicateIndex() if DUPLICATE_CHECK_ENABLED else None
+        self.initialize_components()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.load_categories()
+
+    def update_status(self, message):
+        """Update the status bar text"""
+        self.status_var.set(message)
+
+    def close(self):
+        """Cancel background work and close the window"""
+        self.runner.shutdown()
+        get_metrics().write()
+        self.root.destroy()
+
+    def initialize_components(self):
+        """Initialize all UI components in proper order"""
+        self.create_menu()
+        self.setup_gui()
+        self.create_status_bar()
+        self.add_publish_date_controls()
+
+    # --- Core GUI Components ---
+    def setup_gui(self):
+        """Set up the main GUI components"""
+        self.root.title("Article Generator")
+        self.root.geometry("800x600")
+
+        main_frame = tk.Frame(self.root)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        # Input Section
+        input_frame = tk.Frame(main_frame)
+        input_frame.pack(fill=tk.X, pady=5)
+
+        tk.Label(input_frame, text="Enter Prompt:").pack(side=tk.LEFT)
+        self.prompt_entry = tk.Entry(input_frame, width=50)
+        self.prompt_entry.pack(side=tk.LEFT, padx=5)
+
+        self.use_cache = tk.BooleanVar(value=True)
+        tk.Checkbutton(input_frame, text="Use cache", variable=self.use_cache).pack(side=tk.LEFT)
+
+        # Output Section
+        self.output_text = scrolledtext.ScrolledText(main_frame, wrap=tk.WORD)
+        self.output_text.pack(fill=tk.BOTH, expand=True)
+
+        # Category Section
+        category_frame = tk.LabelFrame(main_frame, text="Select Categories")
+        category_frame.pack(fill=tk.BOTH, padx=10, pady=5)
+
+        self.category_canvas = tk.Canvas(category_frame)
+        self.category_scrollbar = ttk.Scrollbar(
+            category_frame, orient=tk.VERTICAL, command=self.category_canvas.yview
+        )
+        self.category_inner_frame = tk.Frame(self.category_canvas)
+
+        self.category_inner_frame.bind(
+            "<Configure>",
+            lambda e: self.category_canvas.configure(scrollregion=self.category_canvas.bbox("all")),
+        )
+
+        self.category_canvas.create_window((0, 0), window=self.category_inner_frame, anchor="nw")
+        self.category_canvas.configure(yscrollcommand=self.category_scrollbar.set)
+
+        self.category_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.category_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # Bottom Buttons
+        button_frame = tk.Frame(main_frame)
+        button_frame.pack(fill=tk.X, pady=5)
+
+        tk.Button(button_frame, text="Generate", command=self.generate).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Post to WordPress", command=self.post_to_wordpress).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Clear", command=self.clear).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Cancel", command=self.cancel_jobs).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Search Archive", command=self.search_archive).pack(side=tk.LEFT, padx=5)
+
+    def create_status_bar(self):
+        """Create status bar at bottom of window"""
+        status_bar = tk.Label(self.root,
+                              textvariable=self.status_var,
+                              bd=1,
+                              relief=tk.SUNKEN,
+                              anchor=tk.W)
+        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_var.set("Ready")
+
+    # --- Date/Time Picker ---
+    def add_publish_date_controls(self):
+        """Add datetime picker to GUI"""
+        date_frame = tk.Frame(self.root)
+        date_frame.pack(pady=5)
+
+        tk.Label(date_frame, text="Publish Date:").pack(side=tk.LEFT)
+        self.publish_date = DateEntry(date_frame)
+        self.publish_date.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(date_frame, text="Time:").pack(side=tk.LEFT)
+        self.publish_time = tk.Spinbox(
+            date_frame,
+            values=[f"{h:02d}:{m:02d}" for h in range(24) for m in [0, 15, 30, 45]]
+        )
+        self.publish_time.pack(side=tk.LEFT)
+
+        tk.Label(date_frame, text="(Server Timezone)").pack(side=tk.LEFT, padx=5)
+
+    def create_menu(self):
+        """Create menu bar"""
+        menubar = tk.Menu(self.root)
+
+        # File Menu
+        file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu.add_command(label="Search Archive...", command=self.search_archive)
+        file_menu.add_command(label="Exit", command=self.close)
+        menubar.add_cascade(label="File", menu=file_menu)
+
+        # Settings Menu
+        settings_menu = tk.Menu(menubar, tearoff=0)
+        settings_menu.add_command(label="API Key", command=self.set_api_key)
+        settings_menu.add_command(label="WordPress Config", command=self.configure_wordpress)
+        menubar.add_cascade(label="Settings", menu=settings_menu)
+
+        self.root.config(menu=menubar)
+
+    # --- Core Functionality ---
+    def load_categories(self):
+        """Show cached categories at once, then revalidate them in the background"""
+        cached = self.category_cache.load()
+        if cached:
+            self.show_categories(cached['categories'])
+            self.update_status("Checking categories...")
+        else:
+            self.update_status("Loading categories...")
+
+        self.runner.submit(
+            "categories",
+            self.refresh_categories,
+            cached,
+            on_success=self.apply_categories,
+            on_error=self.category_load_failed
+        )
+
+    def refresh_categories(self, cached):
+        """Worker side: conditionally fetch categories and persist any change"""
+        if cached:
+            categories, validators = self.wp_client.fetch_categories(
+                cached['etag'], cached['last_modified'], cached.get('total')
+            )
+        else:
+            categories, validators = self.wp_client.fetch_categories()
+        if categories is not None:
+            self.category_cache.save(categories, validators)
+        return categories
+
+    def apply_categories(self, categories):
+        """Bring the checkboxes in line with freshly fetched categories"""
+        if categories is None:
+            self.update_status("Categories up to date")
+            return
+        if not self.category_widgets:
+            self.show_categories(categories)
+            return
+
+        # Categories still waiting for their checkbox are simply added from the fresh list
+        self.cancel_category_render()
+        shown = [category for category in self.categories if category['id'] in self.category_widgets]
+        added, removed, changed = diff_categories(shown, categories)
+        for category_id in removed:
+            widget = self.category_widgets.pop(category_id, None)
+            if widget is not None:
+                widget.destroy()
+            self.category_vars.pop(category_id, None)
+        for category in changed:
+            widget = self.category_widgets.get(category['id'])
+            if widget is not None:
+                widget.config(text=category['name'])
+        self.categories = categories
+        self.add_category_checkboxes(added, 0)
+
+    def show_categories(self, categories):
+        """Replace the category checkboxes with the loaded categories"""
+        self.categories = categories
+        self.cancel_category_render()
+
+        # Clear existing checkboxes
+        for widget in self.category_inner_frame.winfo_children():
+            widget.destroy()
+
+        self.category_vars = {}
+        self.category_widgets = {}
+        self.add_category_checkboxes(categories, 0)
+
+    def add_category_checkboxes(self, categories, start, chunk=100):
+        """Create checkboxes a chunk per tick so large sites don't stall the UI"""
+        for category in categories[start:start + chunk]:
+            var = tk.BooleanVar()
+            cb = tk.Checkbutton(
+                self.category_inner_frame,
+                text=category['name'],
+                variable=var
+            )
+            cb.pack(anchor="w")
+            self.category_vars[category['id']] = var
+            self.category_widgets[category['id']] = cb
+
+        if start + chunk < len(categories):
+            self.category_render = self.root.after(1, self.add_category_checkboxes, categories, start + chunk, chunk)
+        else:
+            self.category_render = None
+            self.update_status("Categories loaded")
+
+    def cancel_category_render(self):
+        if self.category_render is not None:
+            self.root.after_cancel(self.category_render)
+            self.category_render = None
+
+    def category_load_failed(self, error):
+        messagebox.showerror("Category Error", f"Failed to load categories: {str(error)}")
+        self.update_status("Category load failed")
+
+    def generate(self):
+        """Generate article and image using AI"""
+        prompt = self.prompt_entry.get()
+        if not prompt:
+            messagebox.showwarning("Warning", "Please enter a prompt")
+            return
+
+        bypass_cache = not self.use_cache.get()
+        self.cancel_generation()
+        self.output_text.delete(1.0, tk.END)
+        self.reset_generation(prompt)
+
+        # The image only needs the raw prompt, so both calls run at once
+        self.update_status("Generating article and image...")
+        self.generation_pending = 2
+        self.generation_jobs = [
+            self.runner.submit(
+                "article",
+                self.stream_article,
+                prompt,
+                bypass_cache=bypass_cache,
+                on_success=self.article_finished,
+                on_error=self.generation_failed,
+                with_job=True
+            ),
+            self.runner.submit(
+                "image",
+                self.ai.generate_image_bytes,
+                prompt,
+                bypass_cache=bypass_cache,
+                on_success=self.show_image,
+                on_error=self.generation_failed
+            ),
+        ]
+
+    def generation_finished(self):
+        """Update the status once every generation job has reported back"""
+        self.generation_pending -= 1
+        if self.generation_pending <= 0:
+            self.generation_jobs = []
+            self.archive_generation()
+            if self.status_var.get() != "Error occurred":
+                self.update_status("Ready")
+
+    def reset_generation(self, prompt=None):
+        self.generation += 1
+        self.current_prompt = prompt
+        self.current_article = None
+        self.current_image = None
+        self.current_artifact_id = None
+        self.current_image_path = None
+
+    def archive_generation(self):
+        """Keep the finished article and image in the artifact store"""
+        if not self.current_article:
+            return
+        self.archive_job = self.runner.submit(
+            "archive",
+            self.store_generation,
+            self.generation,
+            self.current_prompt,
+            self.current_article,
+            self.current_image,
+            on_success=self.generation_archived,
+            on_error=self.archive_failed
+        )
+
+    def store_generation(self, generation, prompt, article, image):
+        """Record a generation from a worker thread; returns (generation, artifact id, image path)"""
+        artifact_id = self.artifacts.record(prompt, article, image=image)
+        return generation, artifact_id, self.artifacts.get(artifact_id)['image_path']
+
+    def generation_archived(self, result):
+        generation, artifact_id, image_path = result
+        if generation != self.generation:
+            return  # Archived after a newer generation replaced it
+        self.archive_job = None
+        self.current_artifact_id, self.current_image_path = artifact_id, image_path
+
+    def archive_failed(self, error):
+        self.archive_job = None
+        self.update_status(f"Could not archive the article: {error}")
+
+    def generation_failed(self, error):
+        messagebox.showerror("Error", str(error))
+        self.update_status("Error occurred")
+        self.generation_finished()
+
+    def cancel_generation(self):
+        for job in self.generation_jobs:
+            self.runner.cancel(job)
+        self.generation_jobs = []
+        if self.archive_job is not None:
+            self.runner.cancel(self.archive_job)
+            self.archive_job = None
+
+    def cancel_jobs(self):
+        """Cancel all in-flight generations and uploads"""
+        self.runner.cancel_all()
+        self.generation_jobs = []
+        self.archive_job = None
+        self.update_status("Cancelled")
+
+    def stream_article(self, job, prompt, bypass_cache=False):
+        """Stream the article from a worker thread, posting text in batches"""
+        chunks = []
+        pending = []
+        last_flush = 0.0
+        for delta in self.ai.stream_article(prompt, bypass_cache=bypass_cache):
+            if job.cancelled.is_set():
+                break
+            chunks.append(delta)
+            pending.append(delta)
+            now = time.monotonic()
+            if (now - last_flush) * 1000 >= STREAM_FLUSH_MS:
+                self.runner.post(job, self.append_article, "".join(pending))
+                pending = []
+                last_flush = now
+
+        if pending:
+            self.runner.post(job, self.append_article, "".join(pending))
+        return "".join(chunks)
+
+    def append_article(self, text):
+        """Append streamed article text to the output pane"""
+        self.output_text.insert(tk.END, text)
+
+    def article_finished(self, article):
+        self.current_article = article
+        self.generation_finished()
+
+    def show_image(self, image):
+        """Keep and display the generated image (a GeneratedImage; .image has the pixels)"""
+        self.current_image = image
+        self.display_image()
+        self.generation_finished()
+
+    def post_to_wordpress(self):
+        """Post the generated content to WordPress"""
+        article_content = self.output_text.get(1.0, tk.END).strip()
+        if not article_content:
+            messagebox.showwarning("Warning", "No content to post. Please generate an article first.")
+            return
+        if self.generation_jobs or self.archive_job is not None:
+            # The featured image is posted from the archive, so wait until it is stored
+            messagebox.showinfo("Please wait", "The article and image are still being generated or saved.")
+            return
+
+        try:
+            # Extract the title from the first line of the content
+            title, content_body = split_article(article_content)
+
+            # Get selected categories
+            selected_categories = [
+                cat_id for cat_id, var in self.category_vars.items() if var.get()
+            ]
+
+            publish_date = self.publish_date.get_date()
+            publish_time = self.publish_time.get()
+            full_datetime = datetime.datetime.strptime(f"{publish_date} {publish_time}", "%Y-%m-%d %H:%M").isoformat()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to post to WordPress: {e}")
+            self.update_status("Error occurred")
+            return
+
+        post = {
+            'title': title,
+            'content': content_body,
+            'image_path': self.current_image_path,
+            'categories': selected_categories,
+            'schedule_time': full_datetime,
+        }
+        if self.duplicates is None:
+            self.submit_post(article_content, post)
+            return
+        self.update_status("Checking for near-duplicates...")
+        self.runner.submit(
+            "dedupe",
+            self.find_duplicate,
+            article_content,
+            post,
+            on_success=self.confirm_post,
+            on_error=self.post_failed
+        )
+
+    def find_duplicate(self, article, post):
+        matches = self.duplicates.find(article)
+        return article, post, matches[0] if matches else None
+
+    def confirm_post(self, result):
+        """Ask before posting an article that nearly duplicates one posted earlier"""
+        article, post, match = result
+        if match is not None and not messagebox.askyesno(
+            "Near-duplicate", f"This article is {match}.\n\nPost it anyway?"
+        ):
+            self.update_status("Posting cancelled: near-duplicate article")
+            return
+        self.submit_post(article, post)
+
+    def submit_post(self, article, post):
+        # Use the create_post method of WordPressClient
+        self.update_status("Posting to WordPress...")
+        self.runner.submit(
+            "post",
+            self.post_article,
+            self.current_artifact_id,
+            self.current_prompt,
+            article,
+            **post,
+            on_success=self.post_succeeded,
+            on_error=self.post_failed
+        )
+
+    def post_article(self, artifact_id, prompt, article, **post):
+        """Create the post from a worker thread and record it in the archive and duplicate index"""
+        response = self.wp_client.create_post(**post)
+        # The post exists now; reporting a failure would only get it posted again
+        if artifact_id is not None:
+            try:
+                self.artifacts.mark_posted(artifact_id, response['id'], response.get('featured_media') or None)
+            except Exception:
+                logger.exception("Post %s could not be recorded in the archive", response['id'])
+        if self.duplicates is not None:
+            self.duplicates.add(prompt, article)
+        return response
+
+    def post_succeeded(self, response):
+        messagebox.showinfo("Success", f"Article posted to WordPress! Post ID: {response['id']}")
+        self.update_status("Ready")
+
+    def post_failed(self, error):
+        messagebox.showerror("Error", f"Failed to post to WordPress: {error}")
+        self.update_status("Error occurred")
+
+    def clear(self):
+        """Clear all input and output fields"""
+        self.prompt_entry.delete(0, tk.END)
+        self.output_text.delete(1.0, tk.END)
+        self.publish_date.set_date(datetime.datetime.now())
+        self.publish_time.delete(0, tk.END)
+        self.publish_time.insert(0, "00:00")
+        self.reset_generation()
+        for var in self.category_vars.values():
+            var.set(False)
+        self.update_status("Ready")
+
+    # --- Archive Search ---
+    def search_archive(self):
+        """Check whether a topic has already been covered before generating it"""
+        query = simpledialog.askstring(
+            "Search Archive", "Find archived articles containing:", initialvalue=self.prompt_entry.get()
+        )
+        if not query:
+            return
+        self.update_status("Searching archive...")
+        self.runner.submit(
+            "search",
+            self.find_articles,
+            query,
+            on_success=self.show_search_results,
+            on_error=self.search_failed
+        )
+
+    def find_articles(self, query):
+        return query, self.artifacts.search(query, limit=100)
+
+    def show_search_results(self, result):
+        """List matching articles; double-clicking one loads it into the editor"""
+        query, artifacts = result
+        self.update_status(f"{len(artifacts)} archived articles match \"{query}\"")
+        window = tk.Toplevel(self.root)
+        window.title(f"Archive: {query}")
+        listbox = tk.Listbox(window, width=100, height=min(max(len(artifacts), 5), 25))
+        scrollbar = tk.Scrollbar(window, orient=tk.VERTICAL, command=listbox.yview)
+        listbox.configure(yscrollcommand=scrollbar.set)
+        for artifact in artifacts:
+            created = datetime.datetime.fromtimestamp(artifact['created_at']).strftime("%Y-%m-%d")
+            posted = f"post {artifact['post_id']}" if artifact['post_id'] else "unposted"
+            listbox.insert(tk.END, f"{created}  {posted:>12}  {artifact['title']}")
+        if not artifacts:
+            listbox.insert(tk.END, "No archived article matches")
+        listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        def open_selected(event):
+            selection = listbox.curselection()
+            if selection and artifacts:
+                self.open_archived(artifacts[selection[0]])
+        listbox.bind("<Double-Button-1>", open_selected)
+
+    def open_archived(self, artifact):
+        self.update_status("Loading archived article...")
+        self.runner.submit(
+            "load",
+            self.load_archived,
+            artifact,
+            on_success=self.show_archived,
+            on_error=self.search_failed
+        )
+
+    def load_archived(self, artifact):
+        return artifact, self.artifacts.load_article(artifact['id'])
+
+    def show_archived(self, result):
+        """Put an archived article in the editor so it can be reviewed or posted again"""
+        artifact, article = result
+        self.cancel_generation()
+        self.reset_generation(artifact['prompt'])
+        self.current_article = article
+        self.current_artifact_id = artifact['id']
+        self.current_image_path = artifact['image_path']
+        self.output_text.delete(1.0, tk.END)
+        self.output_text.insert(tk.END, article)
+        self.update_status("Ready")
+
+    def search_failed(self, error):
+        messagebox.showerror("Error", f"Archive search failed: {error}")
+        self.update_status("Error occurred")
+
+    def set_api_key(self):
+        """Set or update the OpenAI API key"""
+        key_file = "openai_api_key.txt"
+
+        if os.path.exists(key_file):
+            with open(key_file, "r") as file:
+                current_key = file.read().strip()
+        else:
+            current_key = ""
+
+        new_key = simpledialog.askstring("Set API Key", "Enter your OpenAI API Key:", initialvalue=current_key)
+
+        if new_key:
+            with open(key_file, "w") as file:
+                file.write(new_key)
+            messagebox.showinfo("Success", "API Key updated successfully!")
+        else:
+            messagebox.showwarning("Warning", "API Key update canceled.")
+
+    def configure_wordpress(self):
+        """Placeholder for WordPress configuration"""
+        messagebox.showinfo("WordPress Config", "WordPress configuration not yet implemented.")
+
+    def display_image(self):
+        """Display generated image (implementation missing in original code)"""
+        # Add your image display logic here
+        pass
+
+
+# Main execution block
+if __name__ == "__main__":
+    root = tk.Tk()
+    app = ArticleApp(root)
     root.mainloop()
\ No newline at end of file
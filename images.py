@@ -0,0 +1,165 @@
+# images.py
+import mimetypes
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from PIL import Image, ImageOps
+from config import IMAGE_FORMAT, IMAGE_QUALITY, IMAGE_PROCESS_WORKERS, THUMBNAIL_SIZES
+
+MEDIA_SIGNATURES = (  # (leading bytes, media type)
+    (b"\x89PNG\r\n\x1a\n", 'image/png'),
+    (b"\xff\xd8\xff", 'image/jpeg'),
+    (b"GIF87a", 'image/gif'),
+    (b"GIF89a", 'image/gif'),
+)
+
+
+def sniff_content_type(head, filename=None):
+    """Identify an image from its first bytes, falling back to the file name"""
+    for signature, content_type in MEDIA_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return 'image/webp'
+    if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"):
+        return 'image/avif'
+    guessed = mimetypes.guess_type(filename)[0] if filename else None
+    return guessed or 'application/octet-stream'
+
+
+class GeneratedImage:
+    """Encoded image bytes exactly as the API returned them.
+
+    Saving and uploading use the bytes as they are, with no decode or
+    re-encode; the pixels are only decoded, once, when .image is read
+    (for example to display the picture).
+    """
+
+    def __init__(self, data, content_type=None):
+        self.data = data
+        self.content_type = content_type or sniff_content_type(data[:16])
+        self._image = None
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def extension(self):
+        return mimetypes.guess_extension(self.content_type) or ""
+
+    @property
+    def image(self):
+        """The decoded PIL Image"""
+        if self._image is None:
+            self._image = Image.open(BytesIO(self.data))
+        return self._image
+
+    def save(self, path):
+        """Write the encoded bytes to path and return it"""
+        with open(path, 'wb') as f:
+            f.write(self.data)
+        return path
+
+
+def _register_avif():
+    """Make AVIF available on Pillow releases without built-in support, if the plugin is installed"""
+    try:
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+    return "AVIF" in Image.registered_extensions().values()
+
+
+def optimize_image(data, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY, thumbnail_sizes=THUMBNAIL_SIZES):
+    """Re-encode image bytes for the web.
+
+    Returns a list of (name, encoded bytes) with the full-size image
+    first, followed by one entry per thumbnail size. Metadata such as
+    EXIF, ICC profiles and PNG text chunks is dropped. This is the CPU
+    heavy part of ImageProcessor and runs in its worker processes.
+    """
+    if image_format == "AVIF" and not _register_avif():
+        raise ValueError("AVIF output needs Pillow 11.2+ or the pillow-avif-plugin package")
+
+    with Image.open(BytesIO(data)) as source:
+        has_alpha = source.mode in ("RGBA", "LA") or "transparency" in source.info
+        image = source.convert("RGBA" if has_alpha else "RGB")
+    image.info = {}
+
+    options = {'quality': quality}
+    if image_format == "WEBP":
+        options['method'] = 6  # Slowest but smallest WebP encoding
+
+    def encode(picture):
+        buffer = BytesIO()
+        picture.save(buffer, format=image_format, **options)
+        return buffer.getvalue()
+
+    variants = [("full", encode(image))]
+    for name, (width, height, crop) in thumbnail_sizes.items():
+        if image.width <= width and image.height <= height:
+            continue  # Like WordPress, never upscale
+        if crop:
+            thumbnail = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            thumbnail = image.copy()
+            thumbnail.thumbnail((width, height), Image.LANCZOS)
+        variants.append((name, encode(thumbnail)))
+    return variants
+
+
+def save_thumbnails(image_path, thumbnails):
+    """Write {size name: GeneratedImage} next to image_path and return {size name: path}"""
+    base = os.path.splitext(image_path)[0]
+    return {size: thumbnail.save(f"{base}-{size}{thumbnail.extension}") for size, thumbnail in thumbnails.items()}
+
+
+class ImageProcessor:
+    """Post-process generated images in a pool of worker processes.
+
+    Decoding, resizing and WebP/AVIF encoding are CPU bound, so running
+    them in processes keeps them off the GIL that the network stages
+    share. process() blocks the calling thread until its image is done,
+    which lets a pipeline stage with one thread per process feed the pool.
+    """
+
+    def __init__(self, workers=IMAGE_PROCESS_WORKERS, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY,
+                 thumbnail_sizes=THUMBNAIL_SIZES):
+        self.workers = workers
+        self.image_format = image_format
+        self.quality = quality
+        self.thumbnail_sizes = thumbnail_sizes
+        self._executor = None
+        self._lock = threading.Lock()  # Many stage threads may submit the first image at once
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, image):
+        """Start processing a GeneratedImage and return the Future of optimize_image()"""
+        with self._lock:
+            if self._executor is None:
+                # Spawned rather than forked: forking a process that runs network threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            executor = self._executor
+        return executor.submit(optimize_image, image.data, self.image_format, self.quality, self.thumbnail_sizes)
+
+    def process(self, image):
+        """Return (optimized GeneratedImage, {size name: GeneratedImage}) for a GeneratedImage"""
+        variants = self.submit(image).result()
+        (_, full), thumbnails = variants[0], variants[1:]
+        return GeneratedImage(full), {name: GeneratedImage(data) for name, data in thumbnails}
+
+    def close(self):
+        """Shut down the worker processes"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
@@ -0,0 +1,459 @@
+# jobs.py
+import argparse
+import json
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from config import (
+    JOBS_DB_FILE, JOB_CLAIM_TIMEOUT, JOB_MAX_ATTEMPTS, IMAGE_FOLDER, IMAGE_OPTIMIZE, WP_BATCH_SIZE,
+    DUPLICATE_CHECK_ENABLED, DUPLICATE_ACTION, ensure_folders_exist
+)
+from ai_services import AIServices
+from wordpress import WordPressClient, split_article
+from metrics import get_metrics
+from images import ImageProcessor, save_thumbnails
+from artifacts import ArtifactStore
+from duplicates import DuplicateIndex, DuplicateArticleError
+from sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# Stages in pipeline order; a job's stage is the last one it completed
+QUEUED = 'queued'
+ARTICLE_GENERATED = 'article_generated'
+IMAGE_GENERATED = 'image_generated'
+MEDIA_UPLOADED = 'media_uploaded'
+POST_CREATED = 'post_created'
+FAILED = 'failed'
+
+STAGES = (QUEUED, ARTICLE_GENERATED, IMAGE_GENERATED, MEDIA_UPLOADED, POST_CREATED)
+OPEN_STAGES = STAGES[:-1]
+GENERATION_STAGES = STAGES[:-2]  # Stages that still need work before the post can be created
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    categories TEXT NOT NULL DEFAULT '[]',
+    schedule_time TEXT,
+    stage TEXT NOT NULL DEFAULT 'queued',
+    article TEXT,
+    artifact_id INTEGER,
+    image_path TEXT,
+    media_id INTEGER,
+    post_id INTEGER,
+    claimed_by TEXT,
+    claimed_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_stage_claim ON jobs (stage, claimed_at, id);
+"""
+
+
+class JobStore(SQLiteStore):
+    """Durable SQLite store for generate -> image -> upload -> post jobs.
+
+    Each job records the last stage it completed together with that stage's
+    output, so a restarted worker picks up where the previous one stopped
+    without paying for the same generation twice. Connections are kept per
+    thread and the database runs in WAL mode so readers never block the
+    worker that is claiming or advancing a job.
+    """
+
+    row_factory = sqlite3.Row
+
+    def __init__(self, path=JOBS_DB_FILE, claim_timeout=JOB_CLAIM_TIMEOUT, max_attempts=JOB_MAX_ATTEMPTS):
+        super().__init__(path)
+        self.claim_timeout = claim_timeout
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'artifact_id' not in columns:  # Databases made before jobs were archived as they went
+                conn.execute("ALTER TABLE jobs ADD COLUMN artifact_id INTEGER")
+
+    def add(self, prompt, categories=None, schedule_time=None):
+        """Queue a prompt and return the new job id"""
+        return self.add_many([prompt], categories, schedule_time)[0]
+
+    def add_many(self, prompts, categories=None, schedule_time=None):
+        """Queue many prompts in one transaction and return their job ids"""
+        now = time.time()
+        categories = json.dumps(categories or [])
+        ids = []
+        with self.transaction() as conn:
+            for prompt in prompts:
+                cursor = conn.execute(
+                    "INSERT INTO jobs (prompt, categories, schedule_time, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (prompt, categories, schedule_time, now, now)
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def claim(self, worker_id, stages=OPEN_STAGES):
+        """Atomically claim the oldest unclaimed job in one of the given stages.
+
+        Claims older than claim_timeout are treated as abandoned by a crashed
+        worker and can be taken over. Returns the job as a dict, or None.
+        """
+        jobs = self.claim_many(worker_id, stages, 1)
+        return jobs[0] if jobs else None
+
+    def claim_many(self, worker_id, stages=OPEN_STAGES, limit=1, minimum=1):
+        """Atomically claim up to limit of the oldest unclaimed jobs in the given stages.
+
+        Nothing is claimed, and [] returned, if fewer than minimum are available.
+        """
+        now = time.time()
+        placeholders = ",".join("?" * len(stages))
+        with self.transaction() as conn:
+            rows = []
+            for claimed_before in (None, now - self.claim_timeout):
+                if claimed_before is None:
+                    condition, params = "claimed_at IS NULL", ()
+                else:
+                    condition, params = "claimed_at < ?", (claimed_before,)
+                rows += conn.execute(
+                    f"SELECT * FROM jobs WHERE stage IN ({placeholders}) AND {condition} ORDER BY id LIMIT ?",
+                    tuple(stages) + params + (limit - len(rows),)
+                ).fetchall()
+                if len(rows) >= limit:
+                    break
+
+            if len(rows) < minimum:
+                rows = []
+            for row in rows:
+                conn.execute(
+                    "UPDATE jobs SET claimed_by = ?, claimed_at = ?, updated_at = ? WHERE id = ?",
+                    (worker_id, now, now, row['id'])
+                )
+        return [self._to_job(row) for row in rows]
+
+    def advance(self, job_id, stage, keep_claim=False, **results):
+        """Record a completed stage with its outputs.
+
+        The claim is released unless keep_claim is set, in which case it is
+        renewed so the same worker can carry on with the next stage.
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown job stage: {stage}")
+        allowed = {'article', 'artifact_id', 'image_path', 'media_id', 'post_id'}
+        unknown = set(results) - allowed
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+
+        now = time.time()
+        claim = "claimed_at = ?" if keep_claim else "claimed_by = NULL, claimed_at = NULL"
+        claim_params = (now,) if keep_claim else ()
+        assignments = "".join(f", {field} = ?" for field in results)
+        self._connect().execute(
+            f"UPDATE jobs SET stage = ?, {claim}, error = NULL, updated_at = ?{assignments} WHERE id = ?",
+            (stage, *claim_params, now, *results.values(), job_id)
+        )
+
+    def fail(self, job_id, error, permanent=False):
+        """Release a job after an error; it is marked failed after max_attempts, or at once if permanent"""
+        self._connect().execute(
+            "UPDATE jobs SET attempts = attempts + 1, error = ?, claimed_by = NULL, claimed_at = NULL, "
+            "stage = CASE WHEN attempts + 1 >= ? THEN ? ELSE stage END, updated_at = ? WHERE id = ?",
+            (str(error), 1 if permanent else self.max_attempts, FAILED, time.time(), job_id)
+        )
+
+    def release(self, job_id):
+        """Give up a claim without recording progress"""
+        self._connect().execute(
+            "UPDATE jobs SET claimed_by = NULL, claimed_at = NULL, updated_at = ? WHERE id = ?",
+            (time.time(), job_id)
+        )
+
+    def retry_failed(self):
+        """Put failed jobs back in the queue at the stage they reached"""
+        # The failed stage overwrote the last completed one, so derive it from the stored outputs
+        cursor = self._connect().execute(
+            "UPDATE jobs SET attempts = 0, updated_at = ?, stage = CASE "
+            "WHEN media_id IS NOT NULL THEN ? WHEN image_path IS NOT NULL THEN ? "
+            "WHEN article IS NOT NULL THEN ? ELSE ? END WHERE stage = ?",
+            (time.time(), MEDIA_UPLOADED, IMAGE_GENERATED, ARTICLE_GENERATED, QUEUED, FAILED)
+        )
+        return cursor.rowcount
+
+    def get(self, job_id):
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def counts(self):
+        """Return the number of jobs in each stage"""
+        rows = self._connect().execute("SELECT stage, COUNT(*) FROM jobs GROUP BY stage").fetchall()
+        counts = {stage: 0 for stage in STAGES + (FAILED,)}
+        counts.update({stage: count for stage, count in rows})
+        return counts
+
+    @staticmethod
+    def _to_job(row):
+        job = dict(row)
+        job['categories'] = json.loads(job['categories'])
+        return job
+
+
+class JobWorker:
+    """Drive claimed jobs through the remaining stages, persisting each one.
+
+    With bulk_posts set, jobs are only taken as far as MEDIA_UPLOADED;
+    the worker then creates their posts WP_BATCH_SIZE at a time through
+    WordPressClient.create_posts(), as soon as a full batch is waiting and
+    for the remainder once nothing is left to generate.
+
+    With an ImageProcessor, images are optimized as in the pipeline
+    before they are saved, so the saved file is the one uploaded.
+    """
+
+    def __init__(self, store, ai, wp_client, worker_id=None, image_folder=IMAGE_FOLDER, bulk_posts=False,
+                 artifacts=None, duplicates=None, reject_duplicates=DUPLICATE_ACTION == "reject", processor=None):
+        self.store = store
+        self.ai = ai
+        self.wp_client = wp_client
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.image_folder = image_folder
+        self.bulk_posts = bulk_posts
+        self.artifacts = artifacts  # Optional ArtifactStore that keeps images and finished articles
+        self.duplicates = duplicates  # Optional DuplicateIndex checked as soon as an article is generated
+        self.reject_duplicates = reject_duplicates
+        self.processor = processor  # Optional ImageProcessor shared by the workers; the caller closes it
+
+    def run(self, stop_event=None):
+        """Process jobs until the queue is empty or stop_event is set"""
+        processed = 0
+        stages = GENERATION_STAGES if self.bulk_posts else OPEN_STAGES
+        until = MEDIA_UPLOADED if self.bulk_posts else POST_CREATED
+        while stop_event is None or not stop_event.is_set():
+            if self.bulk_posts and self.post_batch(full_only=True):
+                continue
+            job = self.store.claim(self.worker_id, stages)
+            if job is None:
+                break
+            self.process(job, until)
+            processed += 1
+        while self.bulk_posts and (stop_event is None or not stop_event.is_set()):
+            if not self.post_batch():
+                break
+        return processed
+
+    def process(self, job, until=POST_CREATED):
+        """Run one job from its current stage to until (POST_CREATED by default)"""
+        try:
+            if job['article'] is not None:
+                self.check_duplicate(job, job['article'])  # Resumed or retried; no-op if already indexed
+            while job['stage'] != until:
+                stage, results = self.run_stage(job)
+                self.store.advance(job['id'], stage, keep_claim=stage != until, **results)
+                job.update(results, stage=stage)
+                if stage == POST_CREATED:
+                    self.mark_posted(job)
+        except Exception as e:
+            self.fail(job, e)
+
+    def fail(self, job, error):
+        """Record a failed attempt; jobs that end up FAILED leave the duplicate index"""
+        # Generating a near-duplicate again gives the same article, so it is not retried
+        self.store.fail(job['id'], error, permanent=isinstance(error, DuplicateArticleError))
+        if self.duplicates is not None and self.store.get(job['id'])['stage'] == FAILED:
+            self.duplicates.remove_owner(self.duplicate_owner(job))
+
+    def duplicate_owner(self, job):
+        return f"{os.path.abspath(self.store.path)}#{job['id']}"
+
+    def check_duplicate(self, job, article):
+        """Check an article against the duplicate index, adding it for this job.
+
+        Raises DuplicateArticleError when duplicates are rejected. The
+        job's own entry never matches, so a job that crashed after its
+        check can safely be checked again.
+        """
+        if self.duplicates is None:
+            return
+        match, _ = self.duplicates.check(job['prompt'], article, add_duplicates=not self.reject_duplicates,
+                                         owner=self.duplicate_owner(job))
+        if match is not None and self.reject_duplicates:
+            raise DuplicateArticleError(match)
+
+    def post_batch(self, full_only=False):
+        """Create posts for a batch of MEDIA_UPLOADED jobs; returns how many were claimed"""
+        jobs = self.store.claim_many(
+            self.worker_id, (MEDIA_UPLOADED,), WP_BATCH_SIZE, WP_BATCH_SIZE if full_only else 1
+        )
+        if not jobs:
+            return 0
+        checked = []
+        for job in jobs:
+            try:
+                self.check_duplicate(job, job['article'])
+            except Exception as e:
+                self.fail(job, e)
+            else:
+                checked.append(job)
+        posts = []
+        for job in checked:
+            title, content = split_article(job['article'])
+            posts.append({
+                'title': title,
+                'content': content,
+                'categories': job['categories'],
+                'schedule_time': job['schedule_time'],
+                'featured_media': job['media_id'],
+            })
+        for job, result in zip(checked, self.wp_client.create_posts(posts) if posts else []):
+            if result.ok:
+                self.store.advance(job['id'], POST_CREATED, post_id=result.post['id'])
+                self.mark_posted(dict(job, post_id=result.post['id']))
+            else:
+                self.fail(job, result.error)
+        return len(jobs)
+
+    def run_stage(self, job):
+        """Run the stage after job['stage'] and return (new stage, outputs)"""
+        stage = job['stage']
+        if stage == QUEUED:
+            article = self.ai.generate_article(job['prompt'])
+            # Archived first, so articles of jobs that go on to fail are kept and searchable too
+            artifact_id = self.archive(job, article)
+            self.check_duplicate(job, article)
+            return ARTICLE_GENERATED, {'article': article, 'artifact_id': artifact_id}
+
+        if stage == ARTICLE_GENERATED:
+            image = self.ai.generate_image_bytes(job['prompt'])
+            thumbnails = {}
+            if self.processor is not None:
+                image, thumbnails = self.processor.process(image)
+            if self.artifacts is not None:
+                image_path = self.artifacts.save_image(image)
+                if job['artifact_id'] is not None:
+                    self.artifacts.attach_image(job['artifact_id'], image_path)
+            else:
+                image_path = image.save(os.path.join(self.image_folder, f"job_{job['id']}{image.extension}"))
+            save_thumbnails(image_path, thumbnails)
+            return IMAGE_GENERATED, {'image_path': image_path}
+
+        if stage == IMAGE_GENERATED:
+            return MEDIA_UPLOADED, {'media_id': self.wp_client.upload_media(job['image_path'])}
+
+        if stage == MEDIA_UPLOADED:
+            title, content = split_article(job['article'])
+            response = self.wp_client.create_post(
+                title=title,
+                content=content,
+                categories=job['categories'],
+                schedule_time=job['schedule_time'],
+                featured_media=job['media_id']
+            )
+            return POST_CREATED, {'post_id': response['id']}
+
+        raise ValueError(f"Job {job['id']} has no stage after {stage}")
+
+    def archive(self, job, article):
+        """Record a newly generated article in the artifact store, if there is one; returns its id or None.
+
+        The archive is best-effort: a failure is logged rather than
+        throwing away the article that was just paid for.
+        """
+        if self.artifacts is None:
+            return None
+        try:
+            return self.artifacts.record(job['prompt'], article)
+        except Exception:
+            logger.exception("Job %s's article could not be archived", job['id'])
+            return None
+
+    def mark_posted(self, job):
+        """Record a posted job's WordPress ids against its artifact.
+
+        Only called once the job is marked POST_CREATED: the post already
+        exists, so a failure here is logged rather than failing the job,
+        which would post it again. Jobs queued before they were archived
+        as they went, or whose archiving failed, are recorded whole.
+        """
+        if self.artifacts is None:
+            return
+        try:
+            if job['artifact_id'] is not None:
+                self.artifacts.mark_posted(job['artifact_id'], job['post_id'], job['media_id'])
+            else:
+                self.artifacts.record(job['prompt'], job['article'], image_path=job['image_path'],
+                                      post_id=job['post_id'], media_id=job['media_id'])
+        except Exception:
+            logger.exception("Job %s was posted as %s but could not be archived", job['id'], job['post_id'])
+
+
+def run_workers(store, ai, wp_client, workers, bulk_posts=False, artifacts=None, duplicates=None,
+                reject_duplicates=DUPLICATE_ACTION == "reject", processor=None):
+    """Run several JobWorkers in threads until the queue drains"""
+    threads = [
+        threading.Thread(target=JobWorker(
+            store, ai, wp_client, worker_id=f"{os.getpid()}:{n}", bulk_posts=bulk_posts, artifacts=artifacts,
+            duplicates=duplicates, reject_duplicates=reject_duplicates, processor=processor
+        ).run)
+        for n in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the durable article job queue")
+    parser.add_argument("--db", default=JOBS_DB_FILE, help="Job database file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="Queue one job per line of a prompts file")
+    add.add_argument("prompts", help="Text file with one prompt per line")
+    add.add_argument("--category", type=int, action="append", help="Category id (repeatable)")
+    add.add_argument("--schedule", help="ISO 8601 publish time")
+
+    run = commands.add_parser("run", help="Process queued jobs, resuming interrupted ones")
+    run.add_argument("-w", "--workers", type=int, default=4)
+    run.add_argument("--no-batch", action="store_true",
+                     help="Create posts one request at a time instead of through /wp-json/batch/v1")
+    run.add_argument("--allow-duplicates", action="store_true",
+                     help="Post near-duplicates of earlier articles instead of failing their jobs")
+    run.add_argument("--no-optimize", action="store_true", help="Upload images as generated, without re-encoding")
+
+    commands.add_parser("status", help="Show job counts per stage")
+    commands.add_parser("retry", help="Re-queue failed jobs")
+
+    args = parser.parse_args(argv)
+    store = JobStore(args.db)
+
+    if args.command == "add":
+        with open(args.prompts, 'r', encoding='utf-8') as f:
+            prompts = [line.strip() for line in f if line.strip()]
+        ids = store.add_many(prompts, args.category, args.schedule)
+        print(f"Queued {len(ids)} jobs")
+    elif args.command == "run":
+        ensure_folders_exist()
+        processor = ImageProcessor() if IMAGE_OPTIMIZE and not args.no_optimize else None
+        try:
+            run_workers(store, AIServices(), WordPressClient(), args.workers, bulk_posts=not args.no_batch,
+                        artifacts=ArtifactStore(), duplicates=DuplicateIndex() if DUPLICATE_CHECK_ENABLED else None,
+                        reject_duplicates=not args.allow_duplicates, processor=processor)
+        finally:
+            if processor is not None:
+                processor.close()
+            get_metrics().write()
+    elif args.command == "retry":
+        print(f"Re-queued {store.retry_failed()} jobs")
+
+    for stage, count in store.counts().items():
+        print(f"{stage:>18}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
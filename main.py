@@ -1,7 +1,7 @@
-from tkinter import Tk
-from gui import ArticleApp
-
-if __name__ == "__main__":
-    root = Tk()
-    app = ArticleApp(root)
+from tkinter import Tk
+from gui import ArticleApp
+
+if __name__ == "__main__":
+    root = Tk()
+    app = ArticleApp(root)
     root.mainloop()
\ No newline at end of file
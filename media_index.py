@@ -0,0 +1,67 @@
+# media_index.py
+import hashlib
+import time
+from config import MEDIA_INDEX_FILE
+from sqlite_store import SQLiteStore
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    wp_url TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    media_id INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (wp_url, sha256)
+);
+"""
+
+
+def content_hash(body):
+    """SHA-256 hex digest of bytes or of a seekable file from its current position.
+
+    Files are read in chunks and rewound afterwards, so hashing costs no
+    more memory than streaming the upload does.
+    """
+    if isinstance(body, bytes):
+        return hashlib.sha256(body).hexdigest()
+    digest = hashlib.sha256()
+    position = body.tell()
+    for chunk in iter(lambda: body.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    body.seek(position)
+    return digest.hexdigest()
+
+
+class MediaIndex(SQLiteStore):
+    """Persistent map from image content hash to WordPress media id.
+
+    Entries are kept per site so one index can serve several blogs. Like
+    the job store it uses one SQLite connection per thread in WAL mode,
+    which lets parallel uploads look up and record hashes concurrently.
+    """
+
+    def __init__(self, path=MEDIA_INDEX_FILE):
+        super().__init__(path)
+        self._connect().executescript(SCHEMA)
+
+    def get(self, wp_url, sha256):
+        """Return the media id recorded for this content, or None"""
+        row = self._connect().execute(
+            "SELECT media_id FROM media WHERE wp_url = ? AND sha256 = ?", (wp_url, sha256)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, wp_url, sha256, media_id, size):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO media (wp_url, sha256, media_id, size, created_at) VALUES (?, ?, ?, ?, ?)",
+            (wp_url, sha256, media_id, size, time.time())
+        )
+
+    def remove(self, wp_url, sha256):
+        """Forget an entry, e.g. after the media was deleted from WordPress"""
+        self._connect().execute("DELETE FROM media WHERE wp_url = ? AND sha256 = ?", (wp_url, sha256))
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM media").fetchone()[0]
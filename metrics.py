@@ -0,0 +1,222 @@
+# metrics.py
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from config import (
+    LATENCY_BUCKETS, METRICS_PROMETHEUS_FILE, METRICS_JSON_FILE,
+    OPENAI_TOKEN_PRICES, OPENAI_IMAGE_PRICES
+)
+
+
+def token_cost(model, prompt_tokens, completion_tokens):
+    """Estimated USD cost of a chat completion"""
+    prompt_price, completion_price = OPENAI_TOKEN_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+def image_cost(model, size, count=1):
+    """Estimated USD cost of generated images"""
+    return OPENAI_IMAGE_PRICES.get((model, size), 0.0) * count
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is a bisect and two additions"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, fraction):
+        """Estimate a quantile by interpolating inside its bucket"""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for position, count in enumerate(self.counts):
+            if count and seen + count >= target:
+                lower = self.buckets[position - 1] if position else 0.0
+                if position == len(self.buckets):
+                    return lower  # Beyond the last bound all we know is the bound itself
+                upper = self.buckets[position]
+                return lower + (upper - lower) * (target - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class OperationStats:
+    """Totals for one instrumented operation"""
+
+    def __init__(self, buckets):
+        self.latency = Histogram(buckets)
+        self.errors = 0
+        self.cache_hits = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+
+
+class Call:
+    """Context manager timing one call; the instrumented code fills in the counters"""
+
+    __slots__ = ('metrics', 'operation', 'started', 'cached', 'bytes_sent', 'bytes_received',
+                 'prompt_tokens', 'completion_tokens', 'cost')
+
+    def __init__(self, metrics, operation):
+        self.metrics = metrics
+        self.operation = operation
+        self.cached = False
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # GeneratorExit (an abandoned stream) is not counted as a failure
+        failed = exc_type is not None and issubclass(exc_type, Exception)
+        self.metrics.record(self, time.perf_counter() - self.started, failed)
+        return False
+
+
+class Metrics:
+    """Latency, bytes, tokens and cost per operation.
+
+    Wrap a call in `with metrics.track("generate_article") as call:` and
+    set call.bytes_sent, call.prompt_tokens, call.cost and so on inside
+    the block. Recording takes one lock and a few additions, so the
+    tracking stays on for every call. The totals are exported as
+    Prometheus text exposition format and as a JSON summary.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.operations = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def track(self, operation):
+        return Call(self, operation)
+
+    def record(self, call, seconds, failed=False):
+        with self._lock:
+            stats = self.operations.get(call.operation)
+            if stats is None:
+                stats = self.operations[call.operation] = OperationStats(self.buckets)
+            stats.latency.observe(seconds)
+            if failed:
+                stats.errors += 1
+            if call.cached:
+                stats.cache_hits += 1
+            stats.bytes_sent += call.bytes_sent
+            stats.bytes_received += call.bytes_received
+            stats.prompt_tokens += call.prompt_tokens
+            stats.completion_tokens += call.completion_tokens
+            stats.cost += call.cost
+
+    def reset(self):
+        with self._lock:
+            self.operations = {}
+            self.started = time.time()
+
+    def summary(self):
+        """Per-operation totals and latency percentiles as plain data"""
+        with self._lock:
+            operations = {}
+            for name, stats in sorted(self.operations.items()):
+                latency = stats.latency
+                operations[name] = {
+                    'calls': latency.count,
+                    'errors': stats.errors,
+                    'cache_hits': stats.cache_hits,
+                    'seconds_total': latency.sum,
+                    'seconds_mean': latency.sum / latency.count if latency.count else None,
+                    'seconds_p50': latency.quantile(0.50),
+                    'seconds_p95': latency.quantile(0.95),
+                    'seconds_p99': latency.quantile(0.99),
+                    'bytes_sent': stats.bytes_sent,
+                    'bytes_received': stats.bytes_received,
+                    'prompt_tokens': stats.prompt_tokens,
+                    'completion_tokens': stats.completion_tokens,
+                    'cost_usd': stats.cost,
+                }
+        return {
+            'started': self.started,
+            'updated': time.time(),
+            'cost_usd': sum(op['cost_usd'] for op in operations.values()),
+            'operations': operations,
+        }
+
+    def prometheus(self):
+        """Render the totals in Prometheus text exposition format"""
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+                lines.append(f"{name}{suffix}{{{label_text}}} {value}")
+
+        with self._lock:
+            operations = sorted(self.operations.items())
+            histogram = []
+            for name, stats in operations:
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), stats.latency.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    histogram.append(("_bucket", (('operation', name), ('le', le)), cumulative))
+                histogram.append(("_sum", (('operation', name),), stats.latency.sum))
+                histogram.append(("_count", (('operation', name),), stats.latency.count))
+            metric("thinker_call_duration_seconds", "histogram", "Time spent in instrumented calls", histogram)
+
+            metric("thinker_call_errors_total", "counter", "Instrumented calls that raised",
+                   [("", (('operation', name),), stats.errors) for name, stats in operations])
+            metric("thinker_cache_hits_total", "counter", "Calls answered from the response cache",
+                   [("", (('operation', name),), stats.cache_hits) for name, stats in operations])
+            metric("thinker_bytes_total", "counter", "Payload bytes transferred",
+                   [("", (('operation', name), ('direction', direction)), value)
+                    for name, stats in operations
+                    for direction, value in (('sent', stats.bytes_sent), ('received', stats.bytes_received))])
+            metric("thinker_tokens_total", "counter", "OpenAI tokens used",
+                   [("", (('operation', name), ('type', kind)), value)
+                    for name, stats in operations
+                    for kind, value in (('prompt', stats.prompt_tokens), ('completion', stats.completion_tokens))
+                    if stats.prompt_tokens or stats.completion_tokens])
+            metric("thinker_cost_dollars_total", "counter", "Estimated OpenAI spend in USD",
+                   [("", (('operation', name),), stats.cost) for name, stats in operations if stats.cost])
+        return "\n".join(lines) + "\n"
+
+    def write(self, prometheus_path=METRICS_PROMETHEUS_FILE, json_path=METRICS_JSON_FILE):
+        """Write both exports, replacing the files atomically"""
+        for path, text in ((prometheus_path, self.prometheus()),
+                           (json_path, json.dumps(self.summary(), indent=2))):
+            if not path:
+                continue
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Return the process-wide metrics registry"""
+    return _metrics
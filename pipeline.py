@@ -0,0 +1,286 @@
+# pipeline.py
+import argparse
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from config import (
+    PIPELINE_WORKERS, PIPELINE_QUEUE_SIZE, IMAGE_FOLDER, IMAGE_OPTIMIZE, DUPLICATE_CHECK_ENABLED, DUPLICATE_ACTION,
+    ensure_folders_exist
+)
+from ai_services import AIServices
+from wordpress import WordPressClient, split_article
+from batch import read_prompts
+from metrics import get_metrics
+from images import ImageProcessor, save_thumbnails
+from artifacts import ArtifactStore
+from duplicates import DuplicateIndex, DuplicateArticleError
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class PipelineItem:
+    """One prompt travelling through the pipeline"""
+
+    def __init__(self, index, prompt):
+        self.index = index
+        self.prompt = prompt
+        self.article = None
+        self.image = None  # GeneratedImage until uploaded
+        self.image_path = None
+        self.thumbnails = {}  # Size name -> GeneratedImage, replaced by paths once written; see THUMBNAIL_SIZES
+        self.media_id = None
+        self.post = None
+        self.artifact_id = None
+        self.duplicate = None  # DuplicateMatch when the article nearly repeats an earlier one
+        self.signature_id = None  # Entry in the duplicate index
+        self.error = None
+        self.failed_stage = None
+        self.timings = {}  # Seconds spent in each stage
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class Stage:
+    """A named step run by its own pool of worker threads"""
+
+    def __init__(self, name, func, workers=1):
+        if workers < 1:
+            raise ValueError(f"Stage {name} needs at least one worker")
+        self.name = name
+        self.func = func
+        self.workers = workers
+
+
+class Pipeline:
+    """Run items through stages connected by bounded queues.
+
+    Every stage has its own workers, so while one item is being generated
+    another can be uploading. The queues between stages hold at most
+    queue_size items each; a fast stage blocks once the next queue is
+    full, which keeps memory bounded however long the input is and lets
+    throughput settle at the rate of the slowest stage.
+    """
+
+    def __init__(self, stages, queue_size=PIPELINE_QUEUE_SIZE):
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def run(self, prompts):
+        """Yield each PipelineItem once it leaves the last stage or fails.
+
+        An error raised while reading prompts is raised here once the
+        items already fed in have come out.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        stop = threading.Event()
+        feed_errors = []
+        threads = [threading.Thread(target=self._feed, args=(prompts, queues[0], stop, feed_errors), daemon=True)]
+        for position, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for n in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(stage, queues[position], queues[position + 1], stop, remaining, lock),
+                    name=f"{stage.name}-{n}",
+                    daemon=True
+                ))
+
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _STOP:
+                    break
+                yield item
+            if feed_errors:
+                raise feed_errors[0]
+        finally:
+            stop.set()
+            # Unblock producers waiting on full queues so every thread can exit
+            for q in queues:
+                self._drain(q)
+
+    def _put(self, q, item, stop):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _feed(self, prompts, out_queue, stop, errors):
+        try:
+            for index, prompt in enumerate(prompts):
+                if not self._put(out_queue, PipelineItem(index, prompt), stop):
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            self._put(out_queue, _STOP, stop)
+
+    def _work(self, stage, in_queue, out_queue, stop, remaining, lock):
+        while not stop.is_set():
+            try:
+                item = in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                # Let sibling workers see the sentinel, then pass it on once all have stopped
+                self._put(in_queue, _STOP, stop)
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    self._put(out_queue, _STOP, stop)
+                return
+
+            if item.ok:
+                started = time.perf_counter()
+                try:
+                    stage.func(item)
+                except Exception as e:
+                    item.error = e
+                    item.failed_stage = stage.name
+                item.timings[stage.name] = time.perf_counter() - started
+            self._put(out_queue, item, stop)
+
+    @staticmethod
+    def _drain(q):
+        while True:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                return
+
+
+def posting_stages(ai, wp_client, workers=None, categories=None, schedule_time=None, image_folder=IMAGE_FOLDER,
+                   processor=None, optimize_images=IMAGE_OPTIMIZE, artifacts=None, duplicates=None,
+                   reject_duplicates=DUPLICATE_ACTION == "reject"):
+    """Build the article -> dedupe -> image -> optimize -> encode -> upload_media -> create_post stages.
+
+    The optimize stage re-encodes each image (WebP by default), and makes
+    any local thumbnails listed in THUMBNAIL_SIZES, in processor's process
+    pool, which the caller creates and closes; it is left out when
+    optimize_images is false. Only the full-size image is uploaded. With an ArtifactStore, images are kept
+    in it instead of image_folder and every article is recorded there.
+    The dedupe stage runs when a DuplicateIndex is given: near-duplicates
+    of earlier articles fail there, before any image is paid for, or with
+    reject_duplicates false are only flagged in item.duplicate.
+    """
+    workers = dict(PIPELINE_WORKERS, **(workers or {}))
+    if optimize_images and processor is None:
+        raise ValueError("Optimizing images needs an ImageProcessor")
+
+    def article(item):
+        item.article = ai.generate_article(item.prompt)
+
+    def dedupe(item):
+        item.duplicate, item.signature_id = duplicates.check(
+            item.prompt, item.article, add_duplicates=not reject_duplicates
+        )
+        if item.duplicate is not None and reject_duplicates:
+            raise DuplicateArticleError(item.duplicate)
+
+    def image(item):
+        item.image = ai.generate_image_bytes(item.prompt)
+
+    def optimize(item):
+        item.image, item.thumbnails = processor.process(item.image)
+
+    def encode(item):
+        # The image is already encoded, so the bytes are written as they are
+        if artifacts is not None:
+            item.image_path = artifacts.save_image(item.image)
+            item.artifact_id = artifacts.record(item.prompt, item.article, image_path=item.image_path)
+        else:
+            name = f"pipeline_{os.getpid()}_{item.index}{item.image.extension}"
+            item.image_path = item.image.save(os.path.join(image_folder, name))
+        item.thumbnails = save_thumbnails(item.image_path, item.thumbnails)
+
+    def upload_media(item):
+        # Upload from the bytes in memory rather than reading the file back
+        item.media_id = wp_client.upload_media(item.image.data, filename=os.path.basename(item.image_path))
+        item.image = None
+
+    def create_post(item):
+        title, content = split_article(item.article)
+        item.post = wp_client.create_post(
+            title=title,
+            content=content,
+            categories=categories,
+            schedule_time=schedule_time,
+            featured_media=item.media_id
+        )
+        if artifacts is not None:
+            # The post exists now; failing the item would only get it posted again
+            try:
+                artifacts.mark_posted(item.artifact_id, item.post['id'], item.media_id)
+            except Exception:
+                logger.exception("Post %s could not be recorded in the archive", item.post['id'])
+
+    funcs = [article, dedupe, image, optimize, encode, upload_media, create_post]
+    if duplicates is None:
+        funcs.remove(dedupe)
+    if not optimize_images:
+        funcs.remove(optimize)
+    return [Stage(func.__name__, func, workers[func.__name__]) for func in funcs]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate and post articles with overlapping stages")
+    parser.add_argument("prompts", help="Text file with one prompt per line")
+    parser.add_argument("--category", type=int, action="append", help="Category id (repeatable)")
+    parser.add_argument("--schedule", help="ISO 8601 publish time")
+    parser.add_argument("--workers", action="append", default=[], metavar="STAGE=N",
+                        help="Worker count for a stage, e.g. article=16 (repeatable)")
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE,
+                        help="Items allowed between two stages")
+    parser.add_argument("--no-optimize", action="store_true", help="Upload images as generated, without re-encoding")
+    parser.add_argument("--allow-duplicates", action="store_true",
+                        help="Post near-duplicates of earlier articles and only report them")
+    args = parser.parse_args(argv)
+
+    workers = {}
+    for spec in args.workers:
+        name, _, count = spec.partition("=")
+        if name not in PIPELINE_WORKERS or not count.isdigit():
+            parser.error(f"Invalid --workers value: {spec}")
+        workers[name] = int(count)
+
+    ensure_folders_exist()
+
+    duplicates = DuplicateIndex() if DUPLICATE_CHECK_ENABLED else None
+    processor = ImageProcessor()
+    stages = posting_stages(AIServices(), WordPressClient(), workers, args.category, args.schedule,
+                            processor=processor, optimize_images=not args.no_optimize, artifacts=ArtifactStore(),
+                            duplicates=duplicates, reject_duplicates=not args.allow_duplicates)
+    failed = 0
+    try:
+        for item in Pipeline(stages, args.queue_size).run(read_prompts(args.prompts)):
+            if item.ok:
+                flag = f" (near-duplicate: {item.duplicate})" if item.duplicate else ""
+                print(f"[{item.index}] posted {item.post['id']}: {item.prompt}{flag}")
+            else:
+                failed += 1
+                print(f"[{item.index}] failed in {item.failed_stage}: {item.error}", file=sys.stderr)
+                if item.signature_id is not None:
+                    # Never posted, so a later run may generate this article again
+                    duplicates.remove(item.signature_id)
+    finally:
+        processor.close()
+        get_metrics().write()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
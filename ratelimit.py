@@ -0,0 +1,157 @@
+# ratelimit.py
+import asyncio
+import re
+import threading
+import time
+from config import OPENAI_RATE_LIMITS
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_reset(value):
+    """Parse an x-ratelimit-reset-* value such as '1s', '6m0s' or '120ms'"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def estimate_tokens(text):
+    """Rough token count for English text (about four characters per token)"""
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """Continuously refilling allowance of `limit` units per minute.
+
+    The level may go negative: a caller that reserves more than is
+    available is told how long to wait, and later callers queue behind it.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.level = float(limit)
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self):
+        return self.limit / 60.0
+
+    def refill(self, now):
+        self.level = min(self.limit, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """Take amount from the bucket and return the seconds to wait for it"""
+        self.refill(now)
+        self.level -= amount
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def clamp(self, limit=None, remaining=None, now=None):
+        """Adopt the limit and remaining count reported by the server"""
+        if limit:
+            self.limit = limit
+        if remaining is not None:
+            self.refill(now)
+            self.level = min(self.level, remaining)
+
+
+class RateLimiter:
+    """Request and token per-minute limits shared by every OpenAI call.
+
+    Callers reserve one request plus their estimated tokens before sending
+    and sleep for the wait that comes back, so concurrent threads and tasks
+    spread themselves out instead of bursting into 429s. The buckets are
+    corrected from x-ratelimit-* response headers, from the actual usage
+    reported in responses, and from Retry-After on any 429 that slips
+    through.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.blocked_until = 0.0
+        self.throttled = 0  # 429 responses seen
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=0):
+        """Reserve capacity for one request and return the seconds to wait"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self.requests.reserve(1, now)
+            if self.tokens is not None and tokens:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+            return max(wait, self.blocked_until - now)
+
+    def acquire(self, tokens=0):
+        """Block the calling thread until the request may be sent"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens=0):
+        """Async counterpart of acquire()"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record_usage(self, estimated, actual):
+        """Correct the token bucket once the real token count is known"""
+        if self.tokens is None or actual is None:
+            return
+        with self._lock:
+            self.tokens.level -= actual - estimated
+
+    def update_from_headers(self, status, headers):
+        """Adjust the buckets from an OpenAI response's rate limit headers"""
+        def number(name):
+            value = headers.get(name)
+            try:
+                return int(value) if value is not None else None
+            except ValueError:
+                return None
+
+        with self._lock:
+            now = time.monotonic()
+            self.requests.clamp(
+                number('x-ratelimit-limit-requests'),
+                number('x-ratelimit-remaining-requests'),
+                now
+            )
+            if self.tokens is not None:
+                self.tokens.clamp(
+                    number('x-ratelimit-limit-tokens'),
+                    number('x-ratelimit-remaining-tokens'),
+                    now
+                )
+
+            if status == 429:
+                self.throttled += 1
+                retry_after = (
+                    parse_reset(headers.get('retry-after'))
+                    or max(parse_reset(headers.get('x-ratelimit-reset-requests')) or 0,
+                           parse_reset(headers.get('x-ratelimit-reset-tokens')) or 0)
+                    or 1.0
+                )
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model):
+    """Return the process-wide limiter for a model, creating it on first use"""
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            requests_per_minute, tokens_per_minute = OPENAI_RATE_LIMITS[model]
+            limiter = _limiters[model] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return limiter
@@ -0,0 +1,42 @@
+# rules.py
+import os
+import threading
+
+
+class RulesFile:
+    """A rules file whose contents are only re-read when it changes on disk"""
+
+    def __init__(self, path):
+        self.path = path
+        self._signature = None
+        self._text = ""
+        self._lock = threading.Lock()
+
+    def read(self):
+        """Return the file contents, or an empty string if it doesn't exist"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._signature = None
+            return ""
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if signature != self._signature:
+                with open(self.path, 'r') as f:
+                    self._text = f.read()
+                self._signature = signature
+            return self._text
+
+
+_rules_files = {}
+_rules_lock = threading.Lock()
+
+
+def load_rules(path):
+    """Load a rules file, reusing the cached text while mtime and size are unchanged"""
+    with _rules_lock:
+        rules_file = _rules_files.get(path)
+        if rules_file is None:
+            rules_file = _rules_files[path] = RulesFile(path)
+    return rules_file.read()
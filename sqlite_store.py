@@ -0,0 +1,50 @@
+# sqlite_store.py
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteStore:
+    """Base for the stores kept in a SQLite file.
+
+    Connections are per thread, in autocommit mode and with the database
+    in WAL mode, so readers never block a writer and one store can be
+    shared by worker threads. Writes that must land together go in a
+    transaction().
+    """
+
+    row_factory = None  # e.g. sqlite3.Row to get rows by column name
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            if self.row_factory is not None:
+                conn.row_factory = self.row_factory
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @contextmanager
+    def transaction(self):
+        """Run the block in one BEGIN IMMEDIATE transaction on this thread's connection, which it yields"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
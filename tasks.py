@@ -0,0 +1,107 @@
+# tasks.py
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import UI_POLL_INTERVAL_MS, UI_FRAME_BUDGET_MS, BACKGROUND_WORKERS
+
+
+class Job:
+    """Handle for a call running on the background executor"""
+
+    def __init__(self, name):
+        self.name = name
+        self.future = None
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        """Cancel the job; a job that already started has its result dropped"""
+        self.cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+
+class BackgroundRunner:
+    """Run blocking calls off the Tk thread and deliver results back to it.
+
+    Workers never touch widgets. They push callbacks onto a thread-safe
+    queue which the Tk thread drains on a `root.after` timer, spending at
+    most UI_FRAME_BUDGET_MS per tick so the window keeps repainting.
+    """
+
+    def __init__(self, root, max_workers=BACKGROUND_WORKERS):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ui-worker")
+        self.results = queue.Queue()
+        self.jobs = set()
+        self._closed = False
+        self._schedule()
+
+    def submit(self, name, func, *args, on_success=None, on_error=None, with_job=False, **kwargs):
+        """Run func(*args, **kwargs) in the background.
+
+        on_success(result) or on_error(exception) is called on the Tk thread
+        unless the job was cancelled first. With with_job=True the Job is
+        passed as the first argument so long-running work can post progress
+        and stop early once it is cancelled.
+        """
+        job = Job(name)
+        self.jobs.add(job)
+        if with_job:
+            args = (job,) + args
+
+        def run():
+            if job.cancelled.is_set():
+                return
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                self.post(job, on_error, e)
+            else:
+                self.post(job, on_success, result)
+            finally:
+                self.post(job, self.jobs.discard, job, always=True)
+
+        job.future = self.executor.submit(run)
+        return job
+
+    def post(self, job, callback, *args, always=False):
+        """Queue callback(*args) to run on the Tk thread; safe from any thread"""
+        if callback is not None:
+            self.results.put((job, callback, args, always))
+
+    def cancel(self, job):
+        job.cancel()
+        self.jobs.discard(job)
+
+    def cancel_all(self):
+        """Cancel every job that is queued or running"""
+        for job in list(self.jobs):
+            self.cancel(job)
+
+    @property
+    def busy(self):
+        return bool(self.jobs)
+
+    def _schedule(self):
+        if not self._closed:
+            self.root.after(UI_POLL_INTERVAL_MS, self._drain)
+
+    def _drain(self):
+        deadline = time.perf_counter() + UI_FRAME_BUDGET_MS / 1000
+        try:
+            while time.perf_counter() < deadline:
+                try:
+                    job, callback, args, always = self.results.get_nowait()
+                except queue.Empty:
+                    break
+                if always or not job.cancelled.is_set():
+                    callback(*args)
+        finally:
+            self._schedule()
+
+    def shutdown(self):
+        """Cancel outstanding work and stop the drain timer"""
+        self._closed = True
+        self.cancel_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,96 +1,374 @@
-# wordpress.py
-import requests
-import os
-from requests.auth import HTTPBasicAuth
-from config import WP_CONFIG_FILE, IMAGE_FOLDER
-
-class WordPressClient:
-    def __init__(self):
-        self.wp_url = None
-        self.auth = None
-        self._load_and_validate_config()
-
-    def _load_and_validate_config(self):
-        config = {}
-        if os.path.exists(WP_CONFIG_FILE):
-            with open(WP_CONFIG_FILE, 'r') as f:
-                for line in f:
-                    if line.strip() and not line.startswith("#") and "=" in line:
-                        key, value = line.split("=", 1)
-                        config[key.strip()] = value.strip()
-
-        required = ['WORDPRESS_URL', 'WORDPRESS_USERNAME', 'WORDPRESS_PASSWORD']
-        missing = [field for field in required if not config.get(field)]
-        
-        if missing:
-            raise ValueError(f"Missing WordPress config: {', '.join(missing)}")
-
-        self.wp_url = config['WORDPRESS_URL'].rstrip('/')
-        self.auth = HTTPBasicAuth(
-            config['WORDPRESS_USERNAME'],
-            config['WORDPRESS_PASSWORD']
-        )
-
-    def upload_media(self, image_path):
-        url = f"{self.wp_url}/wp-json/wp/v2/media"
-        
-        with open(image_path, 'rb') as image_file:
-            response = requests.post(
-                url,
-                files={'file': (os.path.basename(image_path), image_file, 'image/png')},
-                auth=self.auth
-            )
-        
-        response.raise_for_status()
-        return response.json()['id']
-
-    def create_post(self, title, content, image_path=None, categories=None, schedule_time=None):
-        """Create or schedule post"""
-        media_id = None
-        if image_path and os.path.exists(image_path):
-            media_id = self.upload_media(image_path)
-        
-        post_data = {
-            'title': title,
-            'content': content,
-            'status': 'publish' if not schedule_time else 'future',
-            'categories': categories or []
-        }
-        
-        if schedule_time:
-            post_data['date'] = schedule_time  # ISO 8601 format
-            
-        if media_id:
-            post_data['featured_media'] = media_id
-            
-        response = requests.post(
-            f"{self.wp_url}/wp-json/wp/v2/posts",
-            json=post_data,
-            auth=self.auth
-        )
-        
-        response.raise_for_status()
-        return response.json()
-
-def get_categories(self):
-    """Fetch ALL categories from WordPress with pagination handling"""
-    categories = []
-    page = 1
-    while True:
-        url = f"{self.wp_url}/wp-json/wp/v2/categories?per_page=100&page={page}"
-        response = requests.get(url, auth=self.auth)
-        response.raise_for_status()
-        
-        # Add current page categories
-        categories.extend(response.json())
-        
-        # Check if there are more pages
-        if 'X-WP-TotalPages' not in response.headers:
-            break
-            
-        total_pages = int(response.headers['X-WP-TotalPages'])
-        if page >= total_pages:
-            break
-        page += 1
-        
-    return categories
\ No newline at end of file
+# wordpress.py
+import requests
+import os
+import mimetypes
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
+from config import (
+    WP_CONFIG_FILE, IMAGE_FOLDER,
+    WP_POOL_SIZE, WP_MAX_RETRIES, WP_BACKOFF_FACTOR, WP_TIMEOUT, WP_BATCH_SIZE,
+    MEDIA_DEDUP_ENABLED, MEDIA_VERIFY
+)
+from metrics import get_metrics
+from media_index import MediaIndex, content_hash
+from images import sniff_content_type
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = ("GET", "HEAD")  # Safe to repeat after any failure
+THROTTLE_STATUSES = (429, 503)  # Retried for writes too, when the server says when to come back
+CATEGORIES_PER_PAGE = 100  # WordPress REST API maximum
+CATEGORY_FIELDS = "id,name,parent,slug"
+
+def split_article(article):
+    """Split generated text into (title, body) using its first line as the title"""
+    lines = article.strip().split("\n", 1)
+    title = lines[0].strip() if len(lines) > 0 else "Generated Article"
+    content_body = lines[1].strip() if len(lines) > 1 else article
+    return title, content_body
+
+
+class PostResult:
+    """Outcome of one post in a create_posts() call"""
+
+    def __init__(self, index):
+        self.index = index
+        self.post = None
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None and self.post is not None
+
+
+class WriteSafeRetry(Retry):
+    """Retry policy that never repeats a write WordPress may already have applied.
+
+    Reads (RETRY_METHODS) are retried on read errors and every
+    RETRY_STATUSES response. A POST that reached the server could have
+    created its post or media item before a 5xx or timeout came back, so
+    writes are only retried after connection errors, when nothing was
+    sent, and on throttling responses that carry Retry-After.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if self._is_method_retryable(method):
+            return super().is_retry(method, status_code, has_retry_after)
+        return bool(
+            self.total
+            and self.respect_retry_after_header
+            and has_retry_after
+            and status_code in THROTTLE_STATUSES
+        )
+
+
+class WordPressClient:
+    def __init__(self, pool_size=WP_POOL_SIZE, max_retries=WP_MAX_RETRIES,
+                 backoff_factor=WP_BACKOFF_FACTOR, timeout=WP_TIMEOUT,
+                 wp_url=None, username=None, password=None, metrics=None,
+                 dedupe_media=MEDIA_DEDUP_ENABLED, verify_media=MEDIA_VERIFY):
+        self.wp_url = None
+        self.auth = None
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.metrics = metrics or get_metrics()
+        self.supports_batch = None  # Unknown until the first create_posts() call
+        self.media_index = MediaIndex() if dedupe_media else None
+        self.verify_media = verify_media
+        if wp_url:
+            # Explicit site, e.g. a local fake_wordpress server
+            self.wp_url = wp_url.rstrip('/')
+            self.auth = HTTPBasicAuth(username, password)
+        else:
+            self._load_and_validate_config()
+        self.session = self._make_session(pool_size, max_retries, backoff_factor)
+
+    def _make_session(self, pool_size, max_retries, backoff_factor):
+        """Create a keep-alive session that retries throttled and failed requests"""
+        retry = WriteSafeRetry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=RETRY_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.auth = self.auth
+        return session
+
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
+
+    def _load_and_validate_config(self):
+        config = {}
+        if os.path.exists(WP_CONFIG_FILE):
+            with open(WP_CONFIG_FILE, 'r') as f:
+                for line in f:
+                    if line.strip() and not line.startswith("#") and "=" in line:
+                        key, value = line.split("=", 1)
+                        config[key.strip()] = value.strip()
+
+        required = ['WORDPRESS_URL', 'WORDPRESS_USERNAME', 'WORDPRESS_PASSWORD']
+        missing = [field for field in required if not config.get(field)]
+        
+        if missing:
+            raise ValueError(f"Missing WordPress config: {', '.join(missing)}")
+
+        self.wp_url = config['WORDPRESS_URL'].rstrip('/')
+        self.auth = HTTPBasicAuth(
+            config['WORDPRESS_USERNAME'],
+            config['WORDPRESS_PASSWORD']
+        )
+
+    @staticmethod
+    def _record_transfer(call, response):
+        body = response.request.body
+        call.bytes_sent = len(body) if isinstance(body, (bytes, str)) else 0
+        call.bytes_received = len(response.content)
+
+    def upload_media(self, image, filename=None, content_type=None, verify=None):
+        """Upload an image and return its media id.
+
+        image may be a file path, bytes, or a seekable binary file object
+        such as a BytesIO holding a freshly generated image, which is sent
+        from its current position. The body is sent raw with
+        a Content-Disposition header instead of as multipart form data, so
+        a file is streamed from disk in small blocks rather than assembled
+        in memory, and bytes are sent without being copied. The content
+        type is detected from the data unless given.
+
+        With the media index enabled, content already uploaded to this site
+        returns its recorded id without an upload; verify (defaulting to
+        verify_media) first checks that the item still exists.
+        """
+        url = f"{self.wp_url}/wp-json/wp/v2/media"
+        if isinstance(image, (str, os.PathLike)):
+            filename = filename or os.path.basename(image)
+            source = open(image, 'rb')
+        else:
+            source = nullcontext(image)
+
+        with self.metrics.track("upload_media") as call, source as body:
+            digest = None
+            if self.media_index is not None:
+                digest = content_hash(body)
+                media_id = self.media_index.get(self.wp_url, digest)
+                if media_id is not None:
+                    if not (self.verify_media if verify is None else verify) or self.media_exists(media_id):
+                        call.cached = True
+                        return media_id
+                    self.media_index.remove(self.wp_url, digest)
+
+            head, size = self._peek(body)
+            content_type = content_type or sniff_content_type(head, filename)
+            filename = filename or f"image{mimetypes.guess_extension(content_type) or ''}"
+            response = self.session.post(
+                url,
+                data=body,
+                headers={
+                    'Content-Type': content_type,
+                    'Content-Disposition': f'attachment; filename="{filename}"',
+                },
+                timeout=self.timeout
+            )
+            self._record_transfer(call, response)
+            call.bytes_sent = size
+            response.raise_for_status()
+            media_id = response.json()['id']
+            if digest is not None:
+                self.media_index.put(self.wp_url, digest, media_id, size)
+            return media_id
+
+    def media_exists(self, media_id):
+        """Check that a media item is still in the library with a minimal request"""
+        response = self.session.get(
+            f"{self.wp_url}/wp-json/wp/v2/media/{media_id}",
+            params={'_fields': 'id'},
+            timeout=self.timeout
+        )
+        if response.status_code in (404, 410):
+            return False
+        response.raise_for_status()
+        return True
+
+    @staticmethod
+    def _peek(body):
+        """Return (first bytes, remaining size) of bytes or a seekable file without consuming it"""
+        if isinstance(body, bytes):
+            return body[:16], len(body)
+        position = body.tell()
+        head = body.read(16)
+        end = body.seek(0, os.SEEK_END)
+        body.seek(position)
+        return head, end - position
+
+    def _post_data(self, title, content, image_path=None, categories=None, schedule_time=None,
+                   featured_media=None):
+        media_id = featured_media
+        if not media_id and image_path and os.path.exists(image_path):
+            media_id = self.upload_media(image_path)
+        
+        post_data = {
+            'title': title,
+            'content': content,
+            'status': 'publish' if not schedule_time else 'future',
+            'categories': categories or []
+        }
+        
+        if schedule_time:
+            post_data['date'] = schedule_time  # ISO 8601 format
+            
+        if media_id:
+            post_data['featured_media'] = media_id
+        return post_data
+
+    def create_post(self, title, content, image_path=None, categories=None, schedule_time=None,
+                    featured_media=None):
+        """Create or schedule post"""
+        post_data = self._post_data(title, content, image_path, categories, schedule_time, featured_media)
+        return self._send_post(post_data)
+
+    def _send_post(self, post_data):
+        with self.metrics.track("create_post") as call:
+            response = self.session.post(
+                f"{self.wp_url}/wp-json/wp/v2/posts",
+                json=post_data,
+                timeout=self.timeout
+            )
+            self._record_transfer(call, response)
+            response.raise_for_status()
+            return response.json()
+
+    def create_posts(self, posts, batch_size=WP_BATCH_SIZE):
+        """Create many posts with as few round trips as possible.
+
+        posts is a list of create_post() keyword argument dicts. They are
+        sent through /wp-json/batch/v1, batch_size sub-requests per call
+        (WordPress accepts at most 25); sites older than 5.6 answer that
+        route with 404 and get one request per post instead. Returns one
+        PostResult per input in the same order, so a rejected post is
+        reported against its own entry without failing the others.
+        """
+        results = [PostResult(index) for index in range(len(posts))]
+        pending = []
+        for index, post in enumerate(posts):
+            try:
+                pending.append((index, self._post_data(**post)))
+            except Exception as e:  # e.g. the featured image upload failed
+                results[index].error = e
+
+        chunks = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+        if chunks:
+            # The first batch tells us whether the site supports batching at all
+            self._send_chunk(chunks[0], results)
+        if len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.pool_size, len(chunks) - 1)) as executor:
+                list(executor.map(lambda chunk: self._send_chunk(chunk, results), chunks[1:]))
+        return results
+
+    def _send_chunk(self, chunk, results):
+        if self.supports_batch is not False:
+            try:
+                responses = self._send_batch([post_data for _, post_data in chunk])
+            except Exception as e:
+                for index, _ in chunk:
+                    results[index].error = e
+                return
+            if responses is not None:
+                for (index, _), item in zip(chunk, responses):
+                    if 200 <= item.get('status', 500) < 300:
+                        results[index].post = item['body']
+                    else:
+                        results[index].error = self._batch_item_error(item)
+                return
+
+        for index, post_data in chunk:
+            try:
+                results[index].post = self._send_post(post_data)
+            except Exception as e:
+                results[index].error = e
+
+    def _send_batch(self, posts):
+        """POST up to 25 posts in one call; returns their responses, or None without batch support"""
+        payload = {
+            'validation': 'normal',
+            'requests': [{'method': 'POST', 'path': '/wp/v2/posts', 'body': post_data} for post_data in posts],
+        }
+        with self.metrics.track("create_posts") as call:
+            response = self.session.post(f"{self.wp_url}/wp-json/batch/v1", json=payload, timeout=self.timeout)
+            self._record_transfer(call, response)
+            if response.status_code == 404:
+                self.supports_batch = False
+                return None
+            response.raise_for_status()
+            self.supports_batch = True
+            return response.json()['responses']
+
+    @staticmethod
+    def _batch_item_error(item):
+        body = item.get('body') or {}
+        message = body.get('message') if isinstance(body, dict) else None
+        code = body.get('code') if isinstance(body, dict) else None
+        return requests.HTTPError(f"{item.get('status')} {code or 'error'}: {message or 'batch request failed'}")
+
+    def _get_category_page(self, page, headers=None):
+        response = self.session.get(
+            f"{self.wp_url}/wp-json/wp/v2/categories",
+            params={'per_page': CATEGORIES_PER_PAGE, 'page': page, '_fields': CATEGORY_FIELDS},
+            headers=headers,
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response
+
+    def get_categories(self):
+        """Fetch ALL categories from WordPress"""
+        categories, _ = self.fetch_categories()
+        return categories
+
+    def fetch_categories(self, etag=None, last_modified=None, total=None):
+        """Fetch all categories, conditionally when validators are given.
+
+        Page 1 tells us X-WP-TotalPages; the remaining pages are then
+        fetched concurrently over the session's connection pool. Returns
+        (categories, validators), with categories None if the list is
+        unchanged.
+
+        Validators only vouch for page 1, so the request is only made
+        conditional when total (the cached X-WP-Total) fits on one page;
+        longer lists are always fetched in full.
+        """
+        headers = {}
+        if total is not None and total <= CATEGORIES_PER_PAGE:
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        response = self._get_category_page(1, headers)
+        validators = {
+            'etag': response.headers.get('ETag', etag),
+            'last_modified': response.headers.get('Last-Modified', last_modified),
+            'total': response.headers.get('X-WP-Total'),
+        }
+        if response.status_code == 304:
+            validators['total'] = total
+            return None, validators
+
+        categories = response.json()
+        total_pages = int(response.headers.get('X-WP-TotalPages', 1))
+        if total_pages > 1:
+            pages = range(2, total_pages + 1)
+            with ThreadPoolExecutor(max_workers=min(self.pool_size, len(pages))) as executor:
+                for page_categories in executor.map(lambda page: self._get_category_page(page).json(), pages):
+                    categories.extend(page_categories)
+
+        validators['total'] = int(validators['total'] or len(categories))
+        return categories, validators
\ No newline at end of file